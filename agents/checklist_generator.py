@@ -5,7 +5,7 @@ import re
 import regex
 from flask import g
 from langchain.chains import LLMChain, SimpleSequentialChain
-from langchain.chat_models import ChatOpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
 
 from gql.agent import INSERT_AGENT_RESULT
@@ -49,7 +49,7 @@ class ChecklistGenerator():
 
     def generate_checklist_using_subsequent_chain(self, generated_prompt: str):
         # Chain to generate a checklist
-        llm = ChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
+        llm = RateLimitedChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
         dynamic_template = """You are an expert checklist maker/creator. It is your job to create a very clear and detailed checklist using below Prompt,
             
             Prompt: "{final_prompt}"
@@ -1,17 +1,18 @@
 from langchain.chains import LLMChain
-from langchain.llms import OpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
 
-import concurrent.futures
-
+from services.fan_out_service import FanOutService, split_failures
 from utils.langchain.langchain_utils import parse_agent_result_and_get_json
+from utils.utils import get_user_id
 
 
 class ChecklistMetadataGenerator():
     # Variables
-    llm = OpenAI(temperature=0.5, model_name="gpt-3.5-turbo")
+    llm = RateLimitedChatOpenAI(temperature=0.5, model_name="gpt-3.5-turbo")
+    fan_out_service = FanOutService()
 
-    def bulk_generate_metadata(self, checklist, tasks):
+    def bulk_generate_metadata(self, checklist, tasks, org_id=None):
 
         def generate_metadata(task):
             # Chain to generate a checklist
@@ -61,6 +62,16 @@ class ChecklistMetadataGenerator():
 
             return json_result
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            results = list(executor.map(generate_metadata, tasks))
-            return results
+        # Metadata is returned in task order, tasks that failed are left out as long as some succeed
+        # Without an organization the calls are shared fairly per user instead
+        fairness_key = org_id if org_id else "user:" + str(get_user_id())
+        results = self.fan_out_service.map(
+            generate_metadata, tasks, org_id=fairness_key, return_exceptions=True)
+        metadata, failures = split_failures(results)
+
+        if len(failures) > 0:
+            print("Failed to generate metadata for", len(failures), "of", len(results), "tasks:", failures[0])
+        if len(metadata) == 0:
+            raise ValueError("Failed to generate the checklist metadata.")
+
+        return metadata
@@ -2,8 +2,7 @@ from langchain.agents import AgentExecutor, LLMSingleActionAgent
 from langchain.tools import Tool
 from langchain.agents import AgentType
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
-from langchain.llms import OpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI, RateLimitedOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
 from langchain.utilities import GoogleSearchAPIWrapper
 
@@ -20,7 +19,7 @@ class ChecklistPromptGenerator():
 
     def generate_prompt(self, checklist_name, checklist_project, checklist_organization, checklist_role):
         # gpt-3.5-turbo / gpt-4
-        llm = ChatOpenAI(
+        llm = RateLimitedChatOpenAI(
             temperature=0.5, model="gpt-3.5-turbo")
 
         prompt_creator_prompt = PromptTemplate.from_template(
@@ -37,7 +36,7 @@ class ChecklistPromptGenerator():
         llm_search_prompt = PromptTemplate.from_template(
             "You are an assistant who is an expert at answering questions about anything. Answer this question: {question}"
         )
-        llm_search_chain = LLMChain(llm=OpenAI(
+        llm_search_chain = LLMChain(llm=RateLimitedOpenAI(
             temperature=0), prompt=llm_search_prompt)
 
         google_search = GoogleSearchAPIWrapper()
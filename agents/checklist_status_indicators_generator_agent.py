@@ -1,6 +1,6 @@
 
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
 from langchain_core.runnables import RunnableSequence
 
@@ -9,7 +9,7 @@ from utils.langchain.langchain_utils import parse_agent_result_and_get_json
 
 class ChecklistStatusIndicatorsGeneratorAgent():
     # Variables
-    llm = ChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
+    llm = RateLimitedChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
 
     def __init__(self) -> None:
         pass
@@ -55,3 +55,64 @@ class ChecklistStatusIndicatorsGeneratorAgent():
         json_result = parse_agent_result_and_get_json(result)
 
         return json_result
+
+    def generate_bulk_status_indicators(self, checklists):
+        # One LLM call for several checklists, `checklists` is a list of {"title": "", "tasks": []}
+        llm = self.llm
+        dynamic_template = """You are a helpful assistant to generate a set of "status indicators" for checklist tasks. Generate a set of "status indicators" to convey the current condition or state of each item for each of the given Checklists,
+
+            Checklists:
+            {checklists}
+            
+            In order to generate a set of "status indicators" for each checklist we will follow the following rules: 
+                - Generate the status indicators of every checklist independently of the other checklists
+                - Understand the given above few tasks of the checklist and it has more tasks
+                - **Ensure status indicators align with the checklist's purpose & constraints**.
+                - It should be more generic to all task
+                - It should have only one positive status indicators and should be a past tense.
+                - It should have only one negative status indicators and should be a past tense.
+                - It should have only one re-action to the negative status indicators (like "Need attention", "Need repair", "Need review")
+                - Don't include in progress states like "in hold", "in progress", "Pending"
+                - Include "Not Applicable(N/A)" in the list of status indicators if it is required and it should be last one
+                - It should be a single word (or) max of three words
+                - It should be only 4 unique status indicators
+            
+            {format_instructions}"""
+        checklist_format_instructions = """The output should be a markdown code snippet formatted in the following schema, including the leading and trailing "\`\`\`json" and "\`\`\`":
+
+            ```json
+            {
+                "checklists" : [
+                    {
+                        "id" : 0, // id of the checklist as given
+                        "status_indicators" : [
+                            // List of status indicators as string
+                        ]
+                    }
+                ]
+            }
+            ```"""
+        prompt_template = PromptTemplate(
+            input_variables=["checklists"], template=dynamic_template, partial_variables={"format_instructions": checklist_format_instructions})
+        status_indicators_creator_chain: RunnableSequence = prompt_template | llm
+
+        formatted_checklists = "\n".join(
+            ['Id: {}, Checklist: "{}", Tasks: "{}"'.format(index, checklist["title"], ", ".join(checklist["tasks"]))
+             for index, checklist in enumerate(checklists)])
+        result = status_indicators_creator_chain.invoke(
+            {"checklists": formatted_checklists})
+
+        # Parse the output and map the results back to the order of the given checklists
+        json_result = parse_agent_result_and_get_json(result) or {}
+
+        results = [None] * len(checklists)
+        for checklist_result in json_result.get("checklists") or []:
+            if not isinstance(checklist_result, dict):
+                continue
+            index = checklist_result.get("id")
+            if isinstance(index, int) and 0 <= index < len(checklists):
+                results[index] = {
+                    "status_indicators": checklist_result.get("status_indicators")
+                }
+
+        return results
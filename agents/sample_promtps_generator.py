@@ -1,4 +1,4 @@
-from langchain.chat_models import ChatOpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
 from langchain.chains import LLMChain
 from langchain_core.runnables import RunnableSequence
@@ -11,7 +11,7 @@ class SamplePromptsGenerator:
         self.agent_id = agent_id
 
     def generate(self, job_role: str, industry: str) -> list[str]:
-        llm = ChatOpenAI(model="gpt-4", temperature=0.5)
+        llm = RateLimitedChatOpenAI(model="gpt-4", temperature=0.5)
         tpl = PromptTemplate.from_template(
             """
             You are a professional prompt‐engineer.  
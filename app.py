@@ -1,8 +1,10 @@
 import json
 import gc
+import queue
+import time
 
 import jwt
-from flask import Flask, g, jsonify, request
+from flask import Flask, Request, Response, g, jsonify, request
 from flask_cors import CORS
 
 from agents.sample_promtps_generator import SamplePromptsGenerator
@@ -14,18 +16,40 @@ from controllers.checklist_using_agent_controller import ChecklistUsingAgentCont
 from controllers.checklist_metadata_controller import ChecklistMetadataController
 from controllers.checklist_from_document import ChecklistFromDocument
 from controllers.checklist_status_indicators_controller import ChecklistStatusIndicatorsController
+from services.job_service import JobService
+from services.openai_rate_limiter import openai_rate_limiter
 from utils.agent_utils import get_agent_by_id
+from utils.langchain.document_loaders.document_utils import DocumentUtils
+from utils.langchain.llm_cache import setup_llm_cache
+from utils.semantic_cache_utils import semantic_cache
 from utils.utils import is_valid_url
-from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import RequestEntityTooLarge, ServiceUnavailable
 
 # from memory_profiler import profile
 
+document_utils = DocumentUtils()
+
+
+class SpoolingRequest(Request):
+    # Uploads are spooled and hashed while the request body is parsed, within the worker's bytes in flight
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        try:
+            return document_utils.create_upload_spool(total_content_length)
+        except ValueError as error:
+            # The form parser swallows ValueError, the route would only see a missing file
+            raise ServiceUnavailable(str(error))
+
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 CORS(app)
 
 # Set the maximum allowed content length to 50MB
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 
+job_service = JobService()
+llm_cache = setup_llm_cache()
+
 
 @app.before_request
 def token_required():
@@ -53,6 +77,97 @@ def token_required():
             return jsonify({'error': {'message': 'Invalid token!'}}), 401
 
 
+def is_async_request():
+    # Generation routes run as a background job when called with `?async=true`
+    return request.args.get('async', 'false').lower() == 'true'
+
+
+def submit_job(name, func, cleanup=None):
+    try:
+        job = job_service.submit(name, func, cleanup)
+    except PermissionError as error:
+        return jsonify({'error': {'message': str(error)}}), 401
+    except ValueError as error:
+        return jsonify({'error': {'message': str(error)}}), 503
+
+    return jsonify({"data": {
+        "jobId": job["id"],
+        "status": job["status"]
+    }}), 202
+
+
+def get_document_upload():
+    # Form validation shared by the checklist-from-document routes. Returns (upload, None) with the spooled file,
+    # its hashes and the form fields, or (None, error_response) when the request is rejected.
+    if 'file' not in request.files:
+        return None, (jsonify({'error': {'message': 'Missing parameters'}}), 400)
+
+    file = request.files['file']
+
+    # Fetch payload data (form data)
+    org_id = request.form.get('orgId', default=None)
+    project_id = request.form.get('projectId', default=None)
+    prompt = request.form.get('prompt', default=None)
+
+    # Validation
+    if ((org_id is None or org_id == "") or (project_id is None or project_id == "") or (file.filename == '')):
+        return None, (jsonify({"error": {"message": "Missing parameters"}}), 400)
+
+    ALLOWED_CONTENT_TYPES = {'application/pdf', 'text/plain', 'text/csv',
+                             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'application/vnd.ms-excel',
+                             'application/vnd.openxmlformats-officedocument.wordprocessingml.document'}
+    if (file.content_type not in ALLOWED_CONTENT_TYPES):
+        return None, (jsonify({"error": {"message": "File type not allowed. Allowed types are .txt, .pdf, .xlsx, .docx"}}), 400)
+
+    # The upload was spooled and hashed by SpoolingRequest, the loader reads the spool
+    try:
+        file, hexdigests = document_utils.spool_uploaded_file(file, request.content_length)
+    except ValueError as error:
+        return None, (jsonify({'error': {'message': str(error)}}), 503)
+
+    return {
+        "file": file,
+        "hexdigests": hexdigests,
+        "org_id": org_id,
+        "project_id": project_id,
+        "prompt": prompt
+    }, None
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_api(job_id):
+    job = job_service.get_job(job_id)
+
+    # Jobs are only visible to the user who created them
+    if job is None or job["created_by"] != g.get('jwt_session', {}).get('sub', None):
+        return jsonify({'error': {'message': 'Job not found'}}), 404
+
+    return jsonify({"data": {
+        "jobId": job["id"],
+        "name": job["name"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "result": job["result"],
+        "error": job["error"]
+    }})
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job_api(job_id):
+    job = job_service.get_job(job_id)
+
+    if job is None or job["created_by"] != g.get('jwt_session', {}).get('sub', None):
+        return jsonify({'error': {'message': 'Job not found'}}), 404
+
+    job_service.cancel_job(job_id)
+    job = job_service.get_job(job_id)
+
+    return jsonify({"data": {
+        "jobId": job["id"],
+        "status": job["status"]
+    }})
+
+
 @app.route('/generate-checklist', methods=['POST'])
 def generate_checklist_api():
     # Generate a checklist and it will not be persisted in database
@@ -94,16 +209,18 @@ def generate_checklist_using_agent_api():
             (agent_manager_id is None or agent_manager_id == "")):
         return jsonify({'error': {'message': 'Missing parameters'}}), 400
 
-    try:
+    def run(report_stage):
         checklist = ChecklistUsingAgentController(
-            org_id, project_id, name, project, organization, agent_manager_id, role)
+            org_id, project_id, name, project, organization, agent_manager_id, role, report_stage)
         checklist.generate_checklist()
 
-        return jsonify({
-            "data": {
-                "message": "Checklist generated successfully",
-            }
-        }), 200
+        return {"message": "Checklist generated successfully"}
+
+    if is_async_request():
+        return submit_job("generate-checklist-using-agent", run)
+
+    try:
+        return jsonify({"data": run(None)}), 200
     except ValueError as error:
         print("An error occurred:", error)
         return jsonify({'error': {'message': str(error)}}), 500
@@ -131,6 +248,7 @@ def generate_checklist_metadata():
     payload = request.get_json()
     checklist = payload.get("checklist", None)
     tasks = payload.get("tasks", None)
+    org_id = payload.get("orgId", None)
 
     if (checklist is None or checklist == ""):
         return jsonify({'error': {'message': 'Checklist cannot be null'}}), 400
@@ -138,15 +256,20 @@ def generate_checklist_metadata():
     if (tasks is None or len(tasks) == 0):
         return jsonify({'error': {'message': 'Tasks cannot be null'}}), 400
 
-    try:
+    def run(report_stage):
         checklist_metadata_generator = ChecklistMetadataController()
         result = checklist_metadata_generator.generate_checklist_metadata(
             checklist,
-            tasks)
+            tasks,
+            org_id)
+
+        return {"metadata": result}
 
-        return jsonify({"data": {
-            "metadata": result
-        }})
+    if is_async_request():
+        return submit_job("generate-checklist-metadata", run)
+
+    try:
+        return jsonify({"data": run(None)})
     except ValueError as error:
         print("An error occurred:", error)
         return jsonify({'error': {'message': str(error)}}), 500
@@ -157,34 +280,31 @@ def generate_checklist_metadata():
 @app.route('/generate-checklist-from-document', methods=['POST'])
 # @profile
 def generate_checklist_from_document():
-    if 'file' not in request.files:
-        return jsonify({'error': {'message': 'Missing parameters'}}), 400
+    upload, error_response = get_document_upload()
+    if error_response is not None:
+        return error_response
+    file, hexdigests = upload["file"], upload["hexdigests"]
+    org_id, project_id, prompt = upload["org_id"], upload["project_id"], upload["prompt"]
 
-    file = request.files['file']
-
-    # Fetch payload data (form data)
-    org_id = request.form.get('orgId', default=None)
-    project_id = request.form.get('projectId', default=None)
-    prompt = request.form.get('prompt', default=None)
-
-    # Validation
-    if ((org_id is None or org_id == "") or (project_id is None or project_id == "") or (file.filename == '')):
-        return jsonify({"error": {"message": "Missing parameters"}}), 400
+    def run(report_stage):
+        try:
+            checklist_from_document = ChecklistFromDocument(
+                org_id, project_id, report_stage)
+            result = checklist_from_document.generate_checklist_from_document(
+                file, file.content_type, file.filename, prompt, hexdigests["md5"])
+        finally:
+            file.close()
+
+        return {
+            "checklistId": result,
+            "metadata": checklist_from_document.run_metadata
+        }
 
-    ALLOWED_CONTENT_TYPES = {'application/pdf', 'text/plain', 'text/csv',
-                             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'application/vnd.ms-excel',
-                             'application/vnd.openxmlformats-officedocument.wordprocessingml.document'}
-    if (file.content_type not in ALLOWED_CONTENT_TYPES):
-        return jsonify({"error": {"message": "File type not allowed. Allowed types are .txt, .pdf, .xlsx, .docx"}}), 400
+    if is_async_request():
+        return submit_job("generate-checklist-from-document", run, file.close)
 
     try:
-        checklist_from_document = ChecklistFromDocument(org_id, project_id)
-        result = checklist_from_document.generate_checklist_from_document(
-            file, file.content_type, file.filename, prompt)
-
-        return jsonify({"data": {
-            "checklistId": result
-        }})
+        return jsonify({"data": run(None)})
     except ValueError as error:
         print("An error occurred:", error)
         return jsonify({'error': {'message': str(error)}}), 500
@@ -192,6 +312,104 @@ def generate_checklist_from_document():
         gc.collect()
 
 
+@app.route('/generate-checklist-from-document-stream', methods=['POST'])
+def generate_checklist_from_document_stream():
+    # Same as /generate-checklist-from-document, but reports the pipeline progress as Server-Sent Events
+    upload, error_response = get_document_upload()
+    if error_response is not None:
+        return error_response
+    file, hexdigests = upload["file"], upload["hexdigests"]
+    org_id, project_id, prompt = upload["org_id"], upload["project_id"], upload["prompt"]
+
+    events = queue.Queue()
+    started_at = time.time()
+
+    def run(report_stage):
+        current_stage = {"name": None, "started_at": started_at}
+
+        def report_progress(stage, details=None):
+            report_stage(stage, details)
+
+            now = time.time()
+            if stage != current_stage["name"]:
+                events.put(("stage", {
+                    "stage": stage,
+                    "previousStage": current_stage["name"],
+                    "previousStageElapsed": round(now - current_stage["started_at"], 3),
+                    "elapsed": round(now - started_at, 3)
+                }))
+                current_stage["name"] = stage
+                current_stage["started_at"] = now
+
+        def report_task(index, task):
+            events.put(("task", {"index": index, "task": task}))
+
+        try:
+            checklist_from_document = ChecklistFromDocument(
+                org_id, project_id, report_progress, report_task)
+            result = checklist_from_document.generate_checklist_from_document(
+                file, file.content_type, file.filename, prompt, hexdigests["md5"])
+
+            events.put(("completed", {
+                "checklistId": result,
+                "metadata": checklist_from_document.run_metadata,
+                "elapsed": round(time.time() - started_at, 3)
+            }))
+            return {
+                "checklistId": result,
+                "metadata": checklist_from_document.run_metadata
+            }
+        except Exception as error:
+            events.put(("error", {"message": str(error)}))
+            raise
+        finally:
+            file.close()
+
+    try:
+        job = job_service.submit("generate-checklist-from-document-stream", run, file.close)
+    except PermissionError as error:
+        return jsonify({'error': {'message': str(error)}}), 401
+    except ValueError as error:
+        return jsonify({'error': {'message': str(error)}}), 503
+
+    def generate_events():
+        try:
+            yield "event: job\ndata: {}\n\n".format(json.dumps({"jobId": job["id"]}))
+
+            while True:
+                try:
+                    event, data = events.get(timeout=15)
+                except queue.Empty:
+                    # A job cancelled before it started never runs, so it never reports completed or error
+                    current_job = job_service.get_job(job["id"])
+                    if current_job is None or current_job["status"] in ("succeeded", "failed", "cancelled"):
+                        if events.empty():
+                            status = current_job["status"] if current_job is not None else "expired"
+                            yield "event: error\ndata: {}\n\n".format(json.dumps({
+                                "message": "Job {}".format(status),
+                                "status": status
+                            }))
+                            break
+                        continue
+
+                    # Keep the connection alive while a slow stage is running
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield "event: {}\ndata: {}\n\n".format(event, json.dumps(data))
+
+                if event in ("completed", "error"):
+                    break
+        finally:
+            # Nobody listens anymore once the client disconnected, does nothing for a finished job
+            job_service.cancel_job(job["id"])
+
+    return Response(generate_events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 # Example Usage
 @app.route('/generate-checklist-from-document-text', methods=['POST'])
 def generate_checklist_from_document_text():
@@ -216,10 +434,24 @@ def generate_checklist_from_document_text():
         return jsonify({"error": {"message": "File type not allowed. Allowed types are .txt, .pdf, .xlsx, .docx"}}), 400
 
     try:
-        checklist_from_document_text = ChecklistFromDocumentDirectText(org_id, project_id)
-        checklist_id = checklist_from_document_text.generate_checklist_from_document(file, file.content_type, file.filename)
+        file = document_utils.copy_uploaded_file(file, request.content_length)
+    except ValueError as error:
+        return jsonify({'error': {'message': str(error)}}), 503
+
+    def run(report_stage):
+        try:
+            checklist_from_document_text = ChecklistFromDocumentDirectText(org_id, project_id)
+            checklist_id = checklist_from_document_text.generate_checklist_from_document(file, file.content_type, file.filename)
+        finally:
+            file.close()
 
-        return jsonify({"data": {"checklistId": checklist_id}})
+        return {"checklistId": checklist_id}
+
+    if is_async_request():
+        return submit_job("generate-checklist-from-document-text", run, file.close)
+
+    try:
+        return jsonify({"data": run(None)})
     except ValueError as error:
         return jsonify({'error': {'message': str(error)}}), 500
     finally:
@@ -240,13 +472,21 @@ def generate_checklist_from_url():
     if (is_valid_url(url) == False):
         return jsonify({'error': {'message': 'Invalid URL'}}), 400
 
-    try:
-        checklist_from_document = ChecklistFromDocument(org_id, project_id)
+    def run(report_stage):
+        checklist_from_document = ChecklistFromDocument(
+            org_id, project_id, report_stage)
         result = checklist_from_document.generate_checklist_from_url(url, prompt)
 
-        return jsonify({"data": {
-            "checklistId": result
-        }})
+        return {
+            "checklistId": result,
+            "metadata": checklist_from_document.run_metadata
+        }
+
+    if is_async_request():
+        return submit_job("generate-checklist-from-url", run)
+
+    try:
+        return jsonify({"data": run(None)})
     except ValueError as error:
         print("An error occurred:", error)
         return jsonify({'error': {'message': str(error)}}), 500
@@ -271,14 +511,22 @@ def generate_checklist_from_text():
     elif len(words) > 5000:
         return jsonify({'error': {'message': 'Text should contain maximum of 5000 words'}}), 400
 
-    try:
-        checklist_from_document = ChecklistFromDocument(org_id, project_id)
+    def run(report_stage):
+        checklist_from_document = ChecklistFromDocument(
+            org_id, project_id, report_stage)
         result = checklist_from_document.generate_checklist_from_text(
             text, " ".join(words[0:10]))
 
-        return jsonify({"data": {
-            "checklistId": result
-        }})
+        return {
+            "checklistId": result,
+            "metadata": checklist_from_document.run_metadata
+        }
+
+    if is_async_request():
+        return submit_job("generate-checklist-from-text", run)
+
+    try:
+        return jsonify({"data": run(None)})
     except ValueError as error:
         print("An error occurred:", error)
         return jsonify({'error': {'message': str(error)}}), 500
@@ -304,14 +552,19 @@ def generate_checklist_using_prompt():
     elif len(words) > 100:
         return jsonify({'error': {'message': 'Text should contain maximum of 100 words'}}), 400
 
-    try:
-        checklist_from_document = ChecklistFromDocument(org_id, project_id)
+    def run(report_stage):
+        checklist_from_document = ChecklistFromDocument(
+            org_id, project_id, report_stage)
         result = checklist_from_document.generate_checklist_using_given_prompt(
             prompt, is_detailed_checklist)
 
-        return jsonify({"data": {
-            "checklistId": result
-        }})
+        return {"checklistId": result}
+
+    if is_async_request():
+        return submit_job("generate-checklist-using-prompt", run)
+
+    try:
+        return jsonify({"data": run(None)})
     except ValueError as error:
         print("An error occurred:", error)
         return jsonify({'error': {'message': str(error)}}), 500
@@ -344,11 +597,25 @@ def generate_checklist_status_indicators():
         gc.collect()
 
 
+@app.route('/stats', methods=['GET'])
+def stats_api():
+    return jsonify({"data": {
+        "llmCache": llm_cache.get_stats() if llm_cache is not None else None,
+        "semanticCache": semantic_cache.get_stats(),
+        "openaiRateLimits": openai_rate_limiter.get_stats()
+    }})
+
+
 @app.errorhandler(RequestEntityTooLarge)
 def file_too_large(e):
     return jsonify({'error': {'message': str("File is too large")}}), 413
 
 
+@app.errorhandler(ServiceUnavailable)
+def service_unavailable(e):
+    return jsonify({'error': {'message': e.description}}), 503
+
+
 @app.route('/')
 def root_path():
     return 'It is working...'
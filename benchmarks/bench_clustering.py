@@ -0,0 +1,76 @@
+"""Compares the representative selection strategies on synthetic 1536-d embeddings.
+
+Quality is the mean distance of every chunk to its nearest representative (lower is better)
+and the share of the generated topics that got at least one representative.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_clustering
+"""
+import time
+
+import numpy as np
+
+from utils.clustering_utils import get_closest_points, select_representatives
+
+STRATEGIES = ["kmeans", "minibatch_kmeans", "kmeans_plusplus", "farthest_point"]
+
+
+def generate_embeddings(num_chunks, num_topics, dimensions=1536, seed=0):
+    # Unit vectors scattered around `num_topics` topic directions, like chunks of a document
+    random = np.random.default_rng(seed)
+    topics = random.normal(size=(num_topics, dimensions)).astype(np.float32)
+    labels = random.integers(0, num_topics, size=num_chunks)
+    embeddings = topics[labels] + random.normal(
+        scale=0.6, size=(num_chunks, dimensions)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings, labels
+
+
+def legacy_closest_points(embeddings, centers):
+    closest_indices = []
+    for center in centers:
+        distances = np.linalg.norm(embeddings - center, axis=1)
+        closest_indices.append(np.argmin(distances))
+    return closest_indices
+
+
+def main():
+    print("%8s %9s %-18s %10s %14s %10s" % (
+        "chunks", "clusters", "strategy", "seconds", "mean distance", "topics"))
+    for num_chunks in (100, 1000, 10000):
+        num_clusters = max(2, num_chunks // 5) if num_chunks <= 100 else min(100, num_chunks // 5)
+        num_topics = num_clusters
+        embeddings, labels = generate_embeddings(num_chunks, num_topics)
+
+        for strategy in STRATEGIES:
+            started_at = time.perf_counter()
+            indices = select_representatives(
+                embeddings, num_clusters, strategy=strategy)
+            elapsed = time.perf_counter() - started_at
+
+            nearest = get_closest_points(embeddings[indices], embeddings)
+            mean_distance = float(np.mean(np.linalg.norm(
+                embeddings - embeddings[indices][nearest], axis=1)))
+            covered_topics = len(set(labels[indices])) / num_topics
+
+            print("%8d %9d %-18s %10.3f %14.4f %9.0f%%" % (
+                num_chunks, num_clusters, strategy, elapsed, mean_distance, covered_topics * 100))
+
+        # The previous per-cluster loop against the vectorized one, on the same centers
+        centers = embeddings[np.random.default_rng(1).choice(
+            num_chunks, num_clusters, replace=False)]
+        started_at = time.perf_counter()
+        legacy_closest_points(embeddings, centers)
+        legacy_elapsed = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        get_closest_points(embeddings, centers)
+        vectorized_elapsed = time.perf_counter() - started_at
+        print("%8d %9d %-18s %10.3f %14s %10s" % (
+            num_chunks, num_clusters, "closest (loop)", legacy_elapsed, "", ""))
+        print("%8d %9d %-18s %10.3f %14s %10s" % (
+            num_chunks, num_clusters, "closest (vector)", vectorized_elapsed, "", ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Streaming DOCX extraction (lxml iterparse over word/document.xml) against the python-docx object model.
+
+The generated document repeats a section of a heading, paragraphs, a numbered list and a table. For each path
+it reports the time, the peak resident memory of a fresh process, and how many of the table cells made it into
+the text (python-docx `document.paragraphs` skips tables).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_docx_extraction [num_sections]
+"""
+import io
+import multiprocessing
+import sys
+import time
+
+import docx
+
+from benchmarks.memory import get_peak_rss_megabytes
+from utils.langchain.document_loaders.docx_stream_utils import iter_docx_lines
+
+TABLE_ROWS = 5
+TABLE_COLUMNS = 4
+
+
+def generate_docx(num_sections):
+    document = docx.Document()
+    for section in range(num_sections):
+        document.add_heading(f"Section {section}", 1)
+        for paragraph in range(5):
+            document.add_paragraph(f"Paragraph {paragraph} of section {section} describes the procedure in detail. " * 3)
+        for step in range(5):
+            document.add_paragraph(f"Step {step} of section {section}", style="List Number")
+        table = document.add_table(rows=TABLE_ROWS, cols=TABLE_COLUMNS)
+        for row_index, row in enumerate(table.rows):
+            for column_index, cell in enumerate(row.cells):
+                cell.text = f"cell-{section}-{row_index}-{column_index}"
+
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def extract_with_python_docx(docx_bytes):
+    document = docx.Document(io.BytesIO(docx_bytes))
+    return "\n".join(paragraph.text for paragraph in document.paragraphs)
+
+
+def extract_with_stream(docx_bytes):
+    return "\n".join(iter_docx_lines(io.BytesIO(docx_bytes)))
+
+
+def measure(name, docx_bytes, results):
+    # Runs in a fresh process, so that the peak memory belongs to this path alone
+    extract = extract_with_stream if name == "stream" else extract_with_python_docx
+    started_at = time.perf_counter()
+    text = extract(docx_bytes)
+    seconds = time.perf_counter() - started_at
+    results.put((seconds, get_peak_rss_megabytes(), text))
+
+
+def main():
+    num_sections = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    docx_bytes = generate_docx(num_sections)
+    num_cells = num_sections * TABLE_ROWS * TABLE_COLUMNS
+    print("{} sections, {:.1f} MB docx".format(num_sections, len(docx_bytes) / 1024 / 1024))
+
+    context = multiprocessing.get_context("spawn")
+    print("{:<12} {:>8} {:>12} {:>10} {:>14}".format("path", "seconds", "peak RSS MB", "chars", "table cells"))
+    for name in ["python-docx", "stream"]:
+        results = context.Queue()
+        process = context.Process(target=measure, args=(name, docx_bytes, results))
+        process.start()
+        seconds, peak_megabytes, text = results.get()
+        process.join()
+
+        found_cells = text.count("cell-")
+        print("{:<12} {:>8.2f} {:>12.1f} {:>10} {:>8}/{}".format(
+            name, seconds, peak_megabytes, len(text), found_cells, num_cells))
+
+
+if __name__ == "__main__":
+    main()
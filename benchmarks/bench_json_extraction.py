@@ -0,0 +1,57 @@
+"""Compares the JSON extraction of parse_agent_result_and_get_json against the previous regex + json5 implementation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_json_extraction
+"""
+import contextlib
+import io
+import re
+import time
+
+import json5
+import regex
+
+from benchmarks.json_extraction_corpus import build_corpus
+from utils.langchain.langchain_utils import parse_agent_result_and_get_json
+
+
+def legacy_parse(result_string):
+    match = re.search(r'```json\s*(\{.*?\})\s*```', result_string, re.DOTALL)
+    if match:
+        json_string = match.group(1).strip()
+    else:
+        match = regex.search(r'\{(?:[^{}]|(?R))*\}', result_string)
+        if not match:
+            return None
+        json_string = match.group().strip()
+
+    json_string = json_string.replace('\n', '').replace('\r', '').strip()
+    return json5.loads(json_string)
+
+
+def measure(parse, text, repeat):
+    started_at = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                result = parse(text)
+        status = "ok" if result is not None else "none"
+    except Exception:
+        status = "error"
+    return (time.perf_counter() - started_at) / repeat * 1000, status
+
+
+def main(repeat=5):
+    print("%-28s %10s %12s %8s %12s %8s" % (
+        "case", "bytes", "legacy ms", "legacy", "new ms", "new"))
+    for name, text in build_corpus().items():
+        legacy_ms, legacy_status = measure(legacy_parse, text, repeat)
+        new_ms, new_status = measure(
+            parse_agent_result_and_get_json, text, repeat)
+        print("%-28s %10d %12.3f %8s %12.3f %8s" % (
+            name, len(text), legacy_ms, legacy_status, new_ms, new_status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compares the installed PDF text backends on generated PDFs.
+
+For every backend and document size it reports pages/sec, the peak resident memory of a fresh process
+that imported all backends and extracted the document, and the text fidelity: the mean word-level similarity of every extracted page
+to the text that was put on it (1.0 is a perfect match).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pdf_backends [num_pages ...]
+"""
+import difflib
+import multiprocessing
+import sys
+import time
+
+from benchmarks.memory import get_peak_rss_megabytes
+from benchmarks.pdf_corpus import generate_pdf
+from utils.langchain.document_loaders.pdf_page_utils import (close_pdf_document, extract_page_text,
+                                                             get_available_pdf_backends, get_page_count,
+                                                             open_pdf_document)
+
+
+def measure(backend, pdf_bytes, results):
+    # Runs in a fresh process, so that the peak memory belongs to this backend alone
+    started_at = time.perf_counter()
+    document = open_pdf_document(pdf_bytes, backend)
+    pages = [extract_page_text(document, page_number, backend)
+             for page_number in range(get_page_count(document, backend))]
+    close_pdf_document(document)
+    seconds = time.perf_counter() - started_at
+    results.put((seconds, get_peak_rss_megabytes(), pages))
+
+
+def fidelity(pages, expected_pages):
+    ratios = [difflib.SequenceMatcher(None, expected.split(), page.split(), autojunk=False).ratio()
+              for page, expected in zip(pages, expected_pages)]
+    return sum(ratios) / max(1, len(expected_pages))
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [50, 500]
+    context = multiprocessing.get_context("spawn")
+
+    print("{:<10} {:>6} {:>10} {:>12} {:>9}".format("backend", "pages", "pages/s", "peak RSS MB", "fidelity"))
+    for num_pages in sizes:
+        pdf_bytes, expected_pages = generate_pdf(num_pages)
+        for backend in get_available_pdf_backends():
+            results = context.Queue()
+            process = context.Process(target=measure, args=(backend, pdf_bytes, results))
+            process.start()
+            seconds, peak_megabytes, pages = results.get()
+            process.join()
+
+            print("{:<10} {:>6} {:>10.1f} {:>12.1f} {:>9.3f}".format(
+                backend, num_pages, num_pages / seconds, peak_megabytes, fidelity(pages, expected_pages)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Page-parallel PDF extraction against the serial PyPDF2 loop on a synthetic 500-page PDF.
+
+The PDF is spooled to a temp file like a large upload, then extracted by PdfExtractionService with
+1, 2, 4, ... workers up to the core count. The first run of every pool size includes the worker start-up.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pdf_extraction [num_pages]
+"""
+import io
+import os
+import sys
+import time
+
+from PyPDF2 import PdfReader
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.pdf_corpus import generate_pdf
+import services.pdf_extraction_service as pdf_extraction_module
+from services.pdf_extraction_service import PdfExtractionService
+from utils.langchain.document_loaders.document_utils import DocumentUtils
+
+
+def spool(pdf_bytes):
+    uploaded_file = FileStorage(stream=io.BytesIO(pdf_bytes), filename="benchmark.pdf",
+                                content_type="application/pdf")
+    spooled_file, _ = DocumentUtils().spool_uploaded_file(uploaded_file, len(pdf_bytes))
+    return spooled_file
+
+
+def run_serial(pdf_bytes):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def run_pool(spooled_file, num_workers):
+    pdf_extraction_module.PDF_EXTRACTION_MAX_WORKERS = num_workers
+    pdf_extraction_module.PDF_EXTRACTION_MIN_PARALLEL_PAGES = 0
+    return list(PdfExtractionService().iter_page_texts(spooled_file))
+
+
+def main():
+    num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pdf_bytes, expected_pages = generate_pdf(num_pages)
+    spooled_file = spool(pdf_bytes)
+    print("{} pages, {:.1f} MB, {} cores".format(num_pages, len(pdf_bytes) / 1024 / 1024, os.cpu_count()))
+
+    started_at = time.perf_counter()
+    serial_pages = run_serial(pdf_bytes)
+    serial_seconds = time.perf_counter() - started_at
+    print("{:<12} {:>8.2f}s {:>8.1f} pages/s".format("serial", serial_seconds, num_pages / serial_seconds))
+
+    num_workers = 1
+    while num_workers <= max(1, os.cpu_count() or 1):
+        PdfExtractionService.executor = None
+        timings = []
+        for _ in range(2):
+            started_at = time.perf_counter()
+            pages = run_pool(spooled_file, num_workers)
+            timings.append(time.perf_counter() - started_at)
+        PdfExtractionService.executor.shutdown()
+
+        assert pages == serial_pages, "Page texts differ from the serial extraction"
+        print("{:<12} {:>8.2f}s {:>8.1f} pages/s  (cold {:.2f}s)  speedup {:.2f}x".format(
+            "{} workers".format(num_workers), timings[1], num_pages / timings[1], timings[0],
+            serial_seconds / timings[1]))
+        num_workers *= 2
+
+    matching_pages = sum(1 for page, expected in zip(serial_pages, expected_pages)
+                         if " ".join(page.split()) == " ".join(expected.split()))
+    print("pages matching the generated text: {}/{}".format(matching_pages, num_pages))
+    spooled_file.close()
+
+
+if __name__ == "__main__":
+    main()
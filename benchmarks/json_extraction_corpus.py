@@ -0,0 +1,81 @@
+# Malformed LLM outputs seen from the checklist prompts, plus generated variants that scale size, nesting and truncation
+
+SAMPLES = {
+    "code_block": """Sure! Here is the checklist:
+
+```json
+{
+    "title": "New Nurse Onboarding",
+    "tasks": [
+        {"title": "Complete HR paperwork", "subtasks": ["Sign contract", "Submit ID"]},
+        {"title": "Shadow a senior nurse", "subtasks": []}
+    ]
+}
+```""",
+    "schema_comments": """```json
+{
+    "title" : "Kitchen Opening", // checklist title
+    "tasks": [ // list of tasks in the checklist
+        "Turn on the ovens",
+        "Check fridge temperatures",
+    ]
+}
+```""",
+    "no_code_block": """The final answer is {"title": "Fire Drill", "tasks": ["Sound the alarm", "Count staff at the assembly point"]} and you can use it directly.""",
+    "raw_newlines_in_strings": """{"title": "Monthly
+Audit", "tasks": ["Review
+invoices", "Reconcile accounts"]}""",
+    "truncated_in_string": """```json
+{
+    "title": "Warehouse Safety",
+    "tasks": [
+        {"title": "Inspect forklifts", "subtasks": ["Check brakes", "Check hor""",
+    "truncated_after_key": """{"status_indicators": ["Completed", "Failed", "Needs attention"], "notes":""",
+    "unbalanced_prose_braces": """Use the {role} placeholder below } then:
+```json
+{"title": "Placeholders", "tasks": ["Fill {role}", "Send"]}
+```""",
+}
+
+
+def generate_checklist_output(num_tasks, num_subtasks=3, nesting=1, truncate_ratio=None, comments=False):
+    def build_task(index, level):
+        task = '{"title": "Task %d at level %d with braces { and quotes \\" inside"' % (
+            index, level)
+        if level < nesting:
+            children = ", ".join(build_task(child, level + 1)
+                                 for child in range(num_subtasks))
+            task += ', "subtasks": [%s]' % children
+        else:
+            task += ', "subtasks": [%s]' % ", ".join(
+                '"Subtask %d"' % child for child in range(num_subtasks))
+        return task + "}"
+
+    comment = " // list of tasks" if comments else ""
+    tasks = ",\n".join(build_task(index, 1) for index in range(num_tasks))
+    output = '```json\n{"title": "Generated checklist", "tasks": [%s\n%s,\n]}\n```' % (
+        comment, tasks)
+
+    if truncate_ratio is not None:
+        output = output[:int(len(output) * truncate_ratio)]
+
+    return output
+
+
+def build_corpus():
+    corpus = dict(SAMPLES)
+    for num_tasks in (10, 100, 1000):
+        corpus["size_%d" % num_tasks] = generate_checklist_output(num_tasks)
+        corpus["size_%d_comments" % num_tasks] = generate_checklist_output(
+            num_tasks, comments=True)
+        corpus["size_%d_truncated" % num_tasks] = generate_checklist_output(
+            num_tasks, truncate_ratio=0.7)
+    for nesting in (2, 4):
+        corpus["nesting_%d" % nesting] = generate_checklist_output(
+            10, nesting=nesting)
+        corpus["nesting_%d_truncated" % nesting] = generate_checklist_output(
+            10, nesting=nesting, truncate_ratio=0.5)
+
+    # Long unbalanced output is the worst case of the old recursive regex
+    corpus["unbalanced_open_braces"] = "{" * 2000 + " no closing braces"
+    return corpus
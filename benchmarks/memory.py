@@ -0,0 +1,16 @@
+"""Peak memory of the current process, for benchmarks that measure each candidate in a fresh process."""
+import resource
+
+
+def get_peak_rss_megabytes():
+    # VmHWM starts over with the new address space of a spawned process, while ru_maxrss keeps the
+    # peak of the parent that was forked before the exec
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
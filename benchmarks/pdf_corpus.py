@@ -0,0 +1,65 @@
+"""Generates text PDFs for the PDF extraction benchmarks, without any PDF library.
+
+Every page holds `lines_per_page` lines of pseudo-random words in Helvetica, so the expected text of each
+page is known and the extracted text can be compared against it.
+"""
+import random
+
+WORDS = ["inspection", "safety", "valve", "pressure", "check", "report", "operator", "maintenance",
+         "schedule", "equipment", "install", "verify", "document", "approval", "site", "crew",
+         "hazard", "permit", "lockout", "torque", "calibrate", "record", "sign", "review"]
+
+
+def generate_page_lines(page_number, lines_per_page, words_per_line, seed):
+    page_random = random.Random(seed * 100003 + page_number)
+    return [" ".join(page_random.choice(WORDS) for _ in range(words_per_line))
+            for _ in range(lines_per_page)]
+
+
+def generate_pdf(num_pages, lines_per_page=40, words_per_line=10, seed=0):
+    # Returns (pdf bytes, expected text of every page)
+    objects = []
+    expected_pages = []
+
+    def add_object(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add_object(None)
+    pages_id = add_object(None)
+    font_id = add_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for page_number in range(num_pages):
+        lines = generate_page_lines(page_number, lines_per_page, words_per_line, seed)
+        expected_pages.append("\n".join(lines))
+
+        content = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in lines:
+            content.append("({}) Tj T*".format(line))
+        content.append("ET")
+        stream = "\n".join(content).encode("latin-1")
+
+        content_id = add_object(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add_object(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 %d 0 R >> >> "
+            b"/Contents %d 0 R >>" % (pages_id, font_id, content_id)))
+
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), num_pages)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % object_number + body + b"\nendobj\n"
+
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset)
+
+    return bytes(output), expected_pages
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -10,3 +11,100 @@ HASURA_SECRET_KEY = os.environ.get('HASURA_SECRET_KEY')
 HASURA_EVENT_SECRET_KEY = os.environ.get('HASURA_EVENT_SECRET_KEY')
 
 JWT_SECRET = os.environ.get('JWT_SECRET')
+
+# Background job executor for the asynchronous generation API. Jobs live in the memory of one worker process,
+# so the app must run with a single gunicorn worker (enforced by geventlet-config.py)
+JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 4))
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 100))
+JOB_RESULT_TTL_SECONDS = int(os.environ.get('JOB_RESULT_TTL_SECONDS', 3600))
+
+# LLM response cache (in-process LRU with an optional SQLite tier)
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+LLM_CACHE_SQLITE_PATH = os.environ.get('LLM_CACHE_SQLITE_PATH')
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+# The SQLite file may be shared by all workers of the node: a locked database is a miss or a skipped write, not an error
+LLM_CACHE_SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('LLM_CACHE_SQLITE_BUSY_TIMEOUT_MS', 100))
+LLM_CACHE_SQLITE_PURGE_INTERVAL_SECONDS = int(os.environ.get('LLM_CACHE_SQLITE_PURGE_INTERVAL_SECONDS', 600))
+
+# Semantic cache for near-duplicate checklist prompts (opt-in)
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.95))
+SEMANTIC_CACHE_MAX_ENTRIES_PER_ORG = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES_PER_ORG', 1000))
+SEMANTIC_CACHE_MAX_ORGS = int(os.environ.get('SEMANTIC_CACHE_MAX_ORGS', 1000))
+
+# Fan-out engine for the LLM map steps
+FAN_OUT_MAX_CONCURRENCY = int(os.environ.get('FAN_OUT_MAX_CONCURRENCY', 32))
+FAN_OUT_MAX_CONCURRENCY_PER_ORG = int(os.environ.get('FAN_OUT_MAX_CONCURRENCY_PER_ORG', 8))
+FAN_OUT_ITEM_TIMEOUT_SECONDS = float(os.environ.get('FAN_OUT_ITEM_TIMEOUT_SECONDS', 120))
+
+# OpenAI rate limits per model (requests and tokens per minute), e.g. '{"gpt-4": {"rpm": 500, "tpm": 10000}}'
+OPENAI_RATE_LIMITS = json.loads(os.environ.get('OPENAI_RATE_LIMITS', json.dumps({
+    "gpt-3.5-turbo": {"rpm": 3500, "tpm": 90000},
+    "gpt-4": {"rpm": 500, "tpm": 10000},
+    "default": {"rpm": 500, "tpm": 40000}
+})))
+OPENAI_COMPLETION_TOKENS_ESTIMATE = int(os.environ.get('OPENAI_COMPLETION_TOKENS_ESTIMATE', 1000))
+
+# Micro-batching of status indicator generation, a window of 0 disables batching
+STATUS_INDICATORS_BATCH_WINDOW_MS = int(os.environ.get('STATUS_INDICATORS_BATCH_WINDOW_MS', 20))
+STATUS_INDICATORS_MAX_BATCH_SIZE = int(os.environ.get('STATUS_INDICATORS_MAX_BATCH_SIZE', 8))
+
+# Storage encoding of new embedding rows: float32, float16 or int8
+EMBEDDING_STORAGE_DTYPE = os.environ.get('EMBEDDING_STORAGE_DTYPE', 'float32')
+
+# Local embedding cache in front of Hasura, the disk tier is shared by the workers of a node when a directory is set
+EMBEDDING_CACHE_MEMORY_BYTES = int(os.environ.get('EMBEDDING_CACHE_MEMORY_BYTES', 256 * 1024 * 1024))
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR')
+EMBEDDING_CACHE_DISK_BYTES = int(os.environ.get('EMBEDDING_CACHE_DISK_BYTES', 2 * 1024 * 1024 * 1024))
+
+# Representative chunk selection: auto, kmeans, minibatch_kmeans, kmeans_plusplus or farthest_point
+CLUSTERING_STRATEGY = os.environ.get('CLUSTERING_STRATEGY', 'auto')
+CLUSTERING_RANDOM_STATE = int(os.environ.get('CLUSTERING_RANDOM_STATE', 42))
+
+# Number of summarized chunks per document, derived from the final prompt budget, a latency SLO and the fan-out concurrency
+CLUSTER_PROMPT_TOKEN_BUDGET = int(os.environ.get('CLUSTER_PROMPT_TOKEN_BUDGET', 3000))
+CLUSTER_SUMMARY_TOKENS_ESTIMATE = int(os.environ.get('CLUSTER_SUMMARY_TOKENS_ESTIMATE', 250))
+CLUSTER_LATENCY_SLO_SECONDS = float(os.environ.get('CLUSTER_LATENCY_SLO_SECONDS', 60))
+CLUSTER_SUMMARY_LATENCY_SECONDS_ESTIMATE = float(os.environ.get('CLUSTER_SUMMARY_LATENCY_SECONDS_ESTIMATE', 15))
+CLUSTER_MAX_CLUSTERS = int(os.environ.get('CLUSTER_MAX_CLUSTERS', 40))
+
+# Hierarchical summarization: merge summaries in groups until they fit CLUSTER_PROMPT_TOKEN_BUDGET.
+# When enabled, the cluster count is no longer limited by the token budget, only by the latency SLO and the cap.
+SUMMARY_TREE_REDUCE_ENABLED = os.environ.get('SUMMARY_TREE_REDUCE_ENABLED', 'false').lower() == 'true'
+SUMMARY_REDUCE_GROUP_SIZE = int(os.environ.get('SUMMARY_REDUCE_GROUP_SIZE', 4))
+
+# Uploads larger than the memory threshold are spooled to a temp file and memory-mapped by the loaders
+UPLOAD_SPOOL_MAX_MEMORY_BYTES = int(os.environ.get('UPLOAD_SPOOL_MAX_MEMORY_BYTES', 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR')
+UPLOAD_MAX_BYTES_IN_FLIGHT = int(os.environ.get('UPLOAD_MAX_BYTES_IN_FLIGHT', 200 * 1024 * 1024))
+
+# Page-parallel PDF text extraction on a per-worker process pool (0 workers disables it), smaller documents are extracted in-process
+PDF_EXTRACTION_MAX_WORKERS = int(os.environ.get('PDF_EXTRACTION_MAX_WORKERS', min(4, os.cpu_count() or 1)))
+PDF_EXTRACTION_PAGES_PER_TASK = int(os.environ.get('PDF_EXTRACTION_PAGES_PER_TASK', 20))
+PDF_EXTRACTION_MIN_PARALLEL_PAGES = int(os.environ.get('PDF_EXTRACTION_MIN_PARALLEL_PAGES', 40))
+PDF_EXTRACTION_START_METHOD = os.environ.get('PDF_EXTRACTION_START_METHOD', 'spawn')
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 2000))
+# A worker closes its cached PDF once it had no page range of it for this long
+PDF_DOCUMENT_CACHE_IDLE_SECONDS = float(os.environ.get('PDF_DOCUMENT_CACHE_IDLE_SECONDS', 1))
+
+# PDF text backend: pypdf2, pymupdf, pypdfium2 or auto (the fastest one installed)
+PDF_BACKEND = os.environ.get('PDF_BACKEND', 'pypdf2')
+
+# OCR of PDF pages without a text layer, rendered by pypdfium2 at an OCR-friendly DPI on the PDF process pool.
+# When no rasterizer can be loaded, the largest embedded image of each page is recognized as a last resort.
+PDF_OCR_ENABLED = os.environ.get('PDF_OCR_ENABLED', 'true').lower() == 'true'
+PDF_OCR_DPI = int(os.environ.get('PDF_OCR_DPI', 200))
+PDF_OCR_MAX_PAGES = int(os.environ.get('PDF_OCR_MAX_PAGES', 200))
+PDF_OCR_TIME_BUDGET_SECONDS = float(os.environ.get('PDF_OCR_TIME_BUDGET_SECONDS', 120))
+
+# OCR of uploaded images, on the PDF extraction process pool
+OCR_MAX_PIXELS = int(os.environ.get('OCR_MAX_PIXELS', 8 * 1000 * 1000))
+OCR_BINARIZE = os.environ.get('OCR_BINARIZE', 'true').lower() == 'true'
+OCR_MAX_FRAMES = int(os.environ.get('OCR_MAX_FRAMES', 50))
+OCR_TIMEOUT_SECONDS = float(os.environ.get('OCR_TIMEOUT_SECONDS', 60))
+
+# Spreadsheet uploads are read in chunks of rows and flattened up to a row and character cap
+SPREADSHEET_CHUNK_ROWS = int(os.environ.get('SPREADSHEET_CHUNK_ROWS', 10000))
+SPREADSHEET_MAX_ROWS = int(os.environ.get('SPREADSHEET_MAX_ROWS', 200000))
+SPREADSHEET_MAX_CHARACTERS = int(os.environ.get('SPREADSHEET_MAX_CHARACTERS', 20 * 1024 * 1024))
@@ -1,12 +1,12 @@
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.runnables import RunnableSequence
 from langchain_core.prompts.prompt import PromptTemplate
 from utils.langchain.langchain_utils import parse_agent_result_and_get_json
 
 
 class ChecklistController():
-    llm = ChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
+    llm = RateLimitedChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
 
     def __init__(self):
         pass
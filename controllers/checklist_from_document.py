@@ -11,22 +11,31 @@ from utils.langchain.document_loaders.excel_loader import ExcelLoader
 from utils.langchain.document_loaders.image_loader import ImageLoader
 
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.runnables import RunnableSequence
+from langchain_core.globals import get_llm_cache
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
 from langchain_core.prompts.prompt import PromptTemplate
-from utils.langchain.langchain_utils import parse_agent_result_and_get_json
+from utils.langchain.langchain_utils import parse_agent_result_and_get_json, StreamingJsonArrayParser
 from utils.langchain.document_loaders.document_loader_abc import DocumentLoaderInterface
 from utils.langchain.document_loaders.document_utils import DocumentUtils
-import concurrent.futures
+from services.fan_out_service import FanOutService
+from utils.clustering_utils import compute_num_clusters, select_representatives
 from utils.embeddings_utils import EmbeddingUtils
+from utils.summary_cache_utils import SummaryCacheUtils
+from utils.semantic_cache_utils import semantic_cache
+from config import CLUSTER_PROMPT_TOKEN_BUDGET, SEMANTIC_CACHE_ENABLED, SUMMARY_REDUCE_GROUP_SIZE, SUMMARY_TREE_REDUCE_ENABLED
+from services.openai_rate_limiter import count_tokens
 from utils.checklist_utils import save_checklist_with_status_indicators, process_generated_checklist, process_generated_status_indicators
+from utils.utils import get_cancel_event
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
 
-from agents.checklist_status_indicators_generator_agent import ChecklistStatusIndicatorsGeneratorAgent
+from services.status_indicators_batcher import status_indicators_batcher
 
 import numpy as np
-from sklearn.cluster import KMeans
 
 # from memory_profiler import profile
 
@@ -34,16 +43,46 @@ from sklearn.cluster import KMeans
 class ChecklistFromDocument:
     org_id = None
     project_id = None
+    progress_callback = None
+    task_callback = None
+    run_metadata = None
     embedding_utils = EmbeddingUtils()
     document_utils = DocumentUtils()
+    fan_out_service = FanOutService()
+    summary_cache_utils = SummaryCacheUtils()
 
-    llm = ChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
+    llm = RateLimitedChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
 
-    def __init__(self, org_id, project_id) -> None:
+    # Used for the document chunks and for merging summaries in the tree reduce
+    summarization_template = """You are an expert summarizer for given any text. It is your job to generate a summary for the given below text. Text will be enclosed in triple backticks.
+            
+            Text: ```{text}```
+
+            In order to do this we will follow the following rules:
+                - Goal is to give a paragraph summary that reader will have a full understanding
+                - Summary should be concise and easy to read
+                - It should be an prompt to generate a checklist
+            """
+
+    def __init__(self, org_id, project_id, progress_callback=None, task_callback=None) -> None:
         self.org_id = org_id
         self.project_id = project_id
+        # Optional `progress_callback(stage, details)` used by the jobs API to track the pipeline
+        self.progress_callback = progress_callback
+        # Optional `task_callback(index, task)`, the checklist is then streamed and reported task by task
+        self.task_callback = task_callback
+        # Choices made while generating, reported in the response metadata
+        self.run_metadata = {}
         pass
 
+    def report_progress(self, stage, details=None):
+        if self.progress_callback is not None:
+            self.progress_callback(stage, details)
+
+    def report_task(self, index, task):
+        if self.task_callback is not None:
+            self.task_callback(index, task)
+
     def generate_embeddings_from_text(self, text):
         # Text splitter
         text_splitter = RecursiveCharacterTextSplitter(
@@ -52,75 +91,114 @@ class ChecklistFromDocument:
 
         embeddings_model = OpenAIEmbeddings()
 
-        embeddings = embeddings_model.embed_documents(
-            [doc.page_content for doc in splitted_docs])
+        # Chunks are content-addressed, so only new or changed chunks of a re-uploaded document are embedded
+        chunk_hashes = [self.document_utils.generate_md5_for_text(
+            embeddings_model.model + ":" + doc.page_content) for doc in splitted_docs]
+        embeddings_by_chunk_hash = self.embedding_utils.fetch_embeddings_by_chunk_hashes(
+            chunk_hashes, self.org_id)
+
+        missing_docs = {}
+        for chunk_hash, doc in zip(chunk_hashes, splitted_docs):
+            if chunk_hash not in embeddings_by_chunk_hash:
+                missing_docs[chunk_hash] = doc.page_content
+
+        if len(missing_docs) > 0:
+            new_embeddings = embeddings_model.embed_documents(
+                list(missing_docs.values()))
+            embeddings_by_chunk_hash.update(
+                (chunk_hash, {"id": None, "embedding": embedding})
+                for chunk_hash, embedding in zip(missing_docs.keys(), new_embeddings))
+
+        embeddings = [embeddings_by_chunk_hash[chunk_hash]["embedding"]
+                      for chunk_hash in chunk_hashes]
+        # Rows of reused chunks reference the stored vector instead of copying it
+        source_embedding_ids = [embeddings_by_chunk_hash[chunk_hash]["id"]
+                                for chunk_hash in chunk_hashes]
 
         # Delete the object
         del embeddings_model
+        del embeddings_by_chunk_hash
 
         return {
             "splitted_docs": splitted_docs,
-            "embeddings": embeddings
+            "embeddings": embeddings,
+            "chunk_hashes": chunk_hashes,
+            "source_embedding_ids": source_embedding_ids
         }
 
-    def form_cluster(self, num_clusters, embeddings):
-        kmeans = KMeans(n_clusters=num_clusters,
-                        random_state=42).fit(embeddings)
-        return kmeans
+    def summarize_doc(self, doc):
+        # Chain to generate a checklist
+        llm = self.llm
+        prompt_template = PromptTemplate(
+            input_variables=["text"], template=self.summarization_template)
+
+        summarization_chain: RunnableSequence = prompt_template | llm
 
-    def get_closest_points_from_kmeans(self, num_clusters, embeddings, kmeans):
-        closest_indices = []
-        for i in range(num_clusters):
-            distances = np.linalg.norm(
-                embeddings - kmeans.cluster_centers_[i], axis=1)
-            closest_index = np.argmin(distances)
-            closest_indices.append(closest_index)
+        result = summarization_chain.invoke(
+            {"text": doc})
 
-        return closest_indices
+        return result
 
     def summarize_selected_docs(self, selected_docs):
+        texts = [doc.page_content if hasattr(doc, 'page_content') else str(doc) for doc in selected_docs]
 
-        def summarize_doc(doc):
-            # Chain to generate a checklist
-            llm = self.llm
-            dynamic_template = """You are an expert summarizer for given any text. It is your job to generate a summary for the given below text. Text will be enclosed in triple backticks.
-            
-            Text: ```{text}```
+        # Summaries of chunks seen before with the same template and model are reused
+        model = self.llm.model_name
+        template_hash = self.document_utils.generate_md5_for_text(self.summarization_template)
+        chunk_hashes = [self.document_utils.generate_md5_for_text(text) for text in texts]
+        cached_summaries = self.summary_cache_utils.fetch_summaries(
+            self.org_id, chunk_hashes, template_hash, model)
 
-            In order to do this we will follow the following rules:
-                - Goal is to give a paragraph summary that reader will have a full understanding
-                - Summary should be concise and easy to read
-                - It should be an prompt to generate a checklist
-            """
+        missing_indices = [index for index, chunk_hash in enumerate(chunk_hashes)
+                           if chunk_hash not in cached_summaries]
 
-            prompt_template = PromptTemplate(
-                input_variables=["text"], template=dynamic_template)
+        # Summaries are kept in document order, a failed chunk is skipped as long as some succeed
+        results = self.fan_out_service.map(
+            self.summarize_doc, [selected_docs[index] for index in missing_indices],
+            org_id=self.org_id, return_exceptions=True)
 
-            summarization_chain: RunnableSequence = prompt_template | llm
+        new_summaries = {}
+        failures = []
+        for index, result in zip(missing_indices, results):
+            if isinstance(result, Exception):
+                failures.append(result)
+            else:
+                new_summaries[chunk_hashes[index]] = result.content
 
-            result = summarization_chain.invoke(
-                {"text": doc})
+        if len(failures) > 0:
+            print("Failed to summarize", len(failures), "of", len(texts), "chunks:", failures[0])
 
-            return result
+        summaries = []
+        for chunk_hash in chunk_hashes:
+            summary = cached_summaries.get(chunk_hash, new_summaries.get(chunk_hash))
+            if summary is not None:
+                summaries.append(summary)
 
-        # with concurrent.futures.ThreadPoolExecutor() as executor:
-        #     results = list(executor.map(summarize_doc, selected_docs))
-        #     return results
+        if len(summaries) == 0:
+            raise ValueError("Failed to summarize the document.")
 
-        executor = concurrent.futures.ThreadPoolExecutor()
+        self.summary_cache_utils.save_summaries(
+            self.org_id, new_summaries, template_hash, model)
 
-        # Submitting tasks to the executor and gathering future objects
-        futures = [executor.submit(summarize_doc, selected_doc)
-                   for selected_doc in selected_docs]
+        return summaries
 
-        # Waiting for all tasks to complete
-        results = [future.result()
-                   for future in concurrent.futures.as_completed(futures)]
+    def reduce_summaries(self, summarized_docs):
+        # Tree reduce: merge the summaries in groups, level by level, until they fit the final prompt budget
+        summaries = [doc.content if hasattr(doc, 'content') else str(doc) for doc in summarized_docs]
+        group_size = max(2, SUMMARY_REDUCE_GROUP_SIZE)
 
-        # Explicitly shutting down the executor
-        executor.shutdown()
+        level = 0
+        while len(summaries) > 1 and count_tokens(self.llm.model_name, "\n".join(summaries)) > CLUSTER_PROMPT_TOKEN_BUDGET:
+            level += 1
+            self.report_progress("reduce", {"level": level, "summaries": len(summaries)})
 
-        return results
+            groups = ["\n".join(summaries[index:index + group_size])
+                      for index in range(0, len(summaries), group_size)]
+            summaries = self.summarize_selected_docs(groups)
+
+        self.run_metadata["summaryReduceLevels"] = level
+
+        return summaries
 
     def generate_prompt(self, summarized_docs):
         joined_summarized_docs = "\n".join([doc.content if hasattr(doc, 'content') else str(doc) for doc in summarized_docs])
@@ -185,70 +263,118 @@ class ChecklistFromDocument:
         prompt_template = PromptTemplate(
             input_variables=["final_prompt"], template=dynamic_template, partial_variables={"format_instructions": checklist_format_instructions})
 
-        checklist_chain = LLMChain(
-            llm=llm, prompt=prompt_template)
+        # Only streamed when someone listens for the tasks, job polling just needs the stages
+        if self.task_callback is None:
+            checklist_chain = LLMChain(
+                llm=llm, prompt=prompt_template)
 
-        result = checklist_chain.run(
-            {"final_prompt": prompt})
+            result = checklist_chain.run(
+                {"final_prompt": prompt})
+
+            return result
+
+        # Stream the response so that each task is reported as soon as the model produces it.
+        # `stream()` bypasses the LLM cache, so it is looked up and updated here with the keys `LLMChain.run` uses.
+        messages = prompt_template.format_prompt(final_prompt=prompt).to_messages()
+        llm_cache = get_llm_cache() if llm.cache is None else None
+        cache_prompt = dumps(messages)
+        cache_llm_string = llm._get_llm_string()
+
+        cached_generations = llm_cache.lookup(cache_prompt, cache_llm_string) if llm_cache is not None else None
+        if cached_generations:
+            chunks = [cached_generations[0].text]
+        else:
+            chunks = (chunk.content for chunk in llm.stream(messages))
+
+        tasks_parser = StreamingJsonArrayParser("tasks")
+        result = ""
+        task_index = 0
+        for chunk in chunks:
+            result += chunk
+            for task in tasks_parser.feed(chunk):
+                self.report_task(task_index, task)
+                task_index += 1
+
+        if llm_cache is not None and not cached_generations:
+            llm_cache.update(cache_prompt, cache_llm_string,
+                             [ChatGeneration(message=AIMessage(content=result))])
 
         return result
 
-    def generate_checklist(self, text, name, md5_hash, prompt):
+    def generate_checklist(self, text, name, md5_hash, prompt, retry_stale_cache=True):
+        # The text may also be a callable, it is only loaded when the embeddings are not cached yet
         if text is None or text == "":
             raise ValueError("Content not found in the file.")
 
         embeddings = None
         splitted_docs = None
+        embeddings_document_id = None
 
-        # Fetch embeddings from database if it exists
-        fetched_embeddings = self.embedding_utils.fetch_embeddings_from_database(
+        # Fetch only the vectors from database if they exist, the texts are fetched later for the selected chunks
+        fetched_embeddings = self.embedding_utils.fetch_embedding_vectors_from_database(
             md5_hash, self.org_id)
+        self.run_metadata["embeddingsCacheHit"] = fetched_embeddings is not None
         if (fetched_embeddings is None):
+            if callable(text):
+                self.report_progress("extract")
+                text = text()
+                if text is None or text == "":
+                    raise ValueError("Content not found in the file.")
+
+            self.report_progress("embed")
             result = self.generate_embeddings_from_text(text)
-            embeddings = result.get("embeddings")
+            embeddings = np.asarray(result.get("embeddings"), dtype=np.float32)
             splitted_docs = result.get("splitted_docs")
 
             # Save embeddings to database
-            self.embedding_utils.save_embeddings(splitted_docs, embeddings,
-                                                 name, md5_hash, self.org_id)
+            self.embedding_utils.save_embeddings(splitted_docs, result.get("embeddings"),
+                                                 name, md5_hash, self.org_id, result.get("chunk_hashes"),
+                                                 result.get("source_embedding_ids"))
+            del result
         else:
             embeddings = fetched_embeddings.get("embeddings", None)
-            splitted_docs = fetched_embeddings.get("splitted_docs", None)
+            embeddings_document_id = fetched_embeddings.get(
+                "embeddings_document_id", None)
 
         # Validation
-        if (embeddings is None or splitted_docs is None or len(embeddings) != len(splitted_docs)):
+        if (embeddings is None or len(embeddings) == 0 or
+                (splitted_docs is not None and len(embeddings) != len(splitted_docs))):
             raise ValueError("Embeddings or splitted_docs not found")
 
-        # Calculate the number of clusters
-        num_clusters = len(splitted_docs)
-        if num_clusters >= 2 and num_clusters <= 5:
-            num_clusters = 2
-        elif num_clusters > 5 and num_clusters <= 10:
-            num_clusters = 3
-        elif num_clusters > 10 and num_clusters <= 15:
-            num_clusters = 4
-        elif num_clusters > 15 and num_clusters <= 20:
-            num_clusters = 5
-        elif num_clusters > 20:
-            num_clusters = ((10/50)*len(splitted_docs))
-            # Convert num_clusters to int
-            num_clusters = int(num_clusters)
-
-        kmeans = self.form_cluster(num_clusters, embeddings)
-        closest_indices = self.get_closest_points_from_kmeans(
-            num_clusters, embeddings, kmeans)
-
-        selected_indices = sorted(closest_indices)
-        selected_docs = [splitted_docs[selected_index]
-                         for selected_index in selected_indices]
-
+        # Calculate the number of clusters from the token budget, the latency SLO and the fan-out concurrency
+        num_chunks = len(embeddings)
+        num_clusters, clustering_metadata = compute_num_clusters(
+            num_chunks, limit_by_token_budget=not SUMMARY_TREE_REDUCE_ENABLED)
+        self.run_metadata["clustering"] = clustering_metadata
+
+        self.report_progress("cluster")
+        selected_indices = select_representatives(embeddings, num_clusters)
+        if splitted_docs is not None:
+            selected_docs = [splitted_docs[selected_index]
+                             for selected_index in selected_indices]
+        else:
+            selected_docs = self.embedding_utils.fetch_embedding_texts_from_database(
+                embeddings_document_id, selected_indices)
+            if selected_docs is None and fetched_embeddings.get("from_cache") and retry_stale_cache:
+                # The cached embeddings document is gone from the database: start over from the database,
+                # which re-embeds the text when nothing is stored anymore
+                print("Stale embedding cache entry for", md5_hash)
+                self.embedding_utils.evict_cached_embeddings(md5_hash, self.org_id)
+                return self.generate_checklist(text, name, md5_hash, prompt, retry_stale_cache=False)
+            if selected_docs is None:
+                raise ValueError("Embeddings or splitted_docs not found")
+
+        self.report_progress("summarize")
         summarized_docs = self.summarize_selected_docs(selected_docs)
+        summarized_docs = self.reduce_summaries(summarized_docs)
 
+        self.report_progress("prompt")
         generated_prompt = self.generate_prompt(summarized_docs)
 
         if prompt:
             generated_prompt += f"\n{prompt}"
 
+        self.report_progress("checklist")
         checklist_result = self.generate_checklist_using_prompt(
             generated_prompt)
 
@@ -260,8 +386,6 @@ class ChecklistFromDocument:
         del embeddings
         del splitted_docs
 
-        del kmeans
-        del closest_indices
         del selected_indices
         del selected_docs
 
@@ -288,8 +412,8 @@ class ChecklistFromDocument:
             # Convert to string array
             tasks = [task.get("title") for task in tasks]
 
-            checklist_status_indicators_generator_agent = ChecklistStatusIndicatorsGeneratorAgent()
-            generated_status_indicators = checklist_status_indicators_generator_agent.generate_status_indicators(
+            self.report_progress("status_indicators")
+            generated_status_indicators = status_indicators_batcher.generate_status_indicators(
                 generated_checklist.get('title'), tasks)
 
             if generated_status_indicators and generated_status_indicators.get('status_indicators') and len(generated_status_indicators.get('status_indicators')) > 0:
@@ -300,19 +424,21 @@ class ChecklistFromDocument:
 
     def get_document_loader(self, uploaded_file, uploaded_file_content_type) -> DocumentLoaderInterface:
         if uploaded_file_content_type == "application/pdf":
-            return PdfLoader(uploaded_file)
+            return PdfLoader(uploaded_file, get_cancel_event())
         elif uploaded_file_content_type == "text/plain":
             return TxtLoader(uploaded_file)
         elif uploaded_file_content_type == "text/csv":
             return CsvLoader(uploaded_file)
         elif uploaded_file_content_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" or uploaded_file_content_type == "application/vnd.ms-excel":
             return ExcelLoader(uploaded_file)
-        elif uploaded_file_content_type == "image/png" or uploaded_file_content_type == "image/jpeg":
+        elif uploaded_file_content_type == "image/png" or uploaded_file_content_type == "image/jpeg" or uploaded_file_content_type == "image/tiff":
             return ImageLoader(uploaded_file)
         elif uploaded_file_content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
             return DocxLoader(uploaded_file)
 
     def save_checklist(self, generated_checklist, generated_status_indicators):
+        self.report_progress("save")
+
         # Create a checklist to DB
         insert_checklist = process_generated_checklist(
             "", generated_checklist, self.project_id)
@@ -329,20 +455,24 @@ class ChecklistFromDocument:
 
         return checklist_id
 
-    def generate_checklist_from_document(self, uploaded_file, uploaded_file_content_type, uploaded_file_name,prompt):
+    def generate_checklist_from_document(self, uploaded_file, uploaded_file_content_type, uploaded_file_name, prompt, md5_hash=None):
         if uploaded_file is None or uploaded_file_content_type is None or uploaded_file_name is None:
             raise ValueError("Content in the Uploaded file not found")
 
-        md5_hash = self.document_utils.generate_md5_for_uploaded_file(
-            uploaded_file)
+        # The hash is usually computed while the upload is spooled, see DocumentUtils.spool_uploaded_file
+        if md5_hash is None:
+            md5_hash = self.document_utils.generate_md5_for_uploaded_file(
+                uploaded_file)
 
+        # The document is only parsed when its embeddings are not cached yet
         document_loader = self.get_document_loader(
             uploaded_file, uploaded_file_content_type)
-        text = document_loader.get_text()
+        if document_loader is None:
+            raise ValueError("Unsupported file type.")
 
         # Generate checklist
         generated_checklist = self.generate_checklist(
-            text, uploaded_file_name, md5_hash, prompt)
+            document_loader.get_text, uploaded_file_name, md5_hash, prompt)
 
         # Generate status indicators
         generated_status_indicators = self.generate_status_indicators(
@@ -360,10 +490,10 @@ class ChecklistFromDocument:
 
         md5_hash = self.document_utils.generate_md5_for_text(url)
 
+        # The page is only fetched when its embeddings are not cached yet
         html_loader = UrlLoader(url)
-        text = html_loader.get_text()
 
-        generated_checklist = self.generate_checklist(text, url, md5_hash, prompt)
+        generated_checklist = self.generate_checklist(html_loader.get_text, url, md5_hash, prompt)
 
         # Generate status indicators
         generated_status_indicators = self.generate_status_indicators(
@@ -381,7 +511,7 @@ class ChecklistFromDocument:
 
         md5_hash = self.document_utils.generate_md5_for_text(text)
 
-        generated_checklist = self.generate_checklist(text, name, md5_hash)
+        generated_checklist = self.generate_checklist(text, name, md5_hash, None)
 
         # Generate status indicators
         generated_status_indicators = self.generate_status_indicators(
@@ -432,17 +562,42 @@ class ChecklistFromDocument:
         if prompt is None or prompt == "":
             raise ValueError("Missing required parameters")
 
+        self.report_progress("checklist")
         checklist_result = None
-        if is_detailed_checklist is True:
-            checklist_result = self.generate_checklist_using_prompt(
-                prompt)
-        else:
-            checklist_result = self.generate_minimal_checklist_using_prompt(
-                prompt)
+
+        # Paraphrased prompts of the same organization reuse a previously generated checklist
+        prompt_embedding = None
+        semantic_cache_namespace = "detailed" if is_detailed_checklist is True else "minimal"
+        if SEMANTIC_CACHE_ENABLED:
+            try:
+                prompt_embedding = semantic_cache.get_embedding(prompt)
+                checklist_result = semantic_cache.lookup(
+                    self.org_id, semantic_cache_namespace, prompt_embedding)
+            except Exception as error:
+                # The cache only speeds things up, the checklist is generated without it
+                print("Semantic cache unavailable:", error)
+                prompt_embedding = None
+        cache_hit = checklist_result is not None
+
+        if checklist_result is None:
+            if is_detailed_checklist is True:
+                checklist_result = self.generate_checklist_using_prompt(
+                    prompt)
+            else:
+                checklist_result = self.generate_minimal_checklist_using_prompt(
+                    prompt)
 
         # Parse the output and get JSON
         generated_checklist = parse_agent_result_and_get_json(checklist_result)
 
+        if cache_hit:
+            # Listeners still get the tasks, which were not streamed from a model
+            for task_index, task in enumerate((generated_checklist or {}).get('tasks') or []):
+                self.report_task(task_index, task)
+        elif prompt_embedding is not None and generated_checklist:
+            semantic_cache.store(self.org_id, semantic_cache_namespace,
+                                 prompt_embedding, checklist_result)
+
         # Generate status indicators
         generated_status_indicators = self.generate_status_indicators(
             generated_checklist)
@@ -8,7 +8,7 @@ from utils.langchain.document_loaders.excel_loader import ExcelLoader
 from utils.langchain.document_loaders.image_loader import ImageLoader
 
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
+from utils.langchain.rate_limited_llms import RateLimitedChatOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
 from langchain_core.runnables import RunnableSequence
 from utils.langchain.langchain_utils import parse_agent_result_and_get_json
@@ -18,14 +18,14 @@ from utils.checklist_utils import save_checklist_with_status_indicators, process
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import gc
 
-from agents.checklist_status_indicators_generator_agent import ChecklistStatusIndicatorsGeneratorAgent
+from services.status_indicators_batcher import status_indicators_batcher
 
 class ChecklistFromDocumentDirectText:
     org_id = None
     project_id = None
     document_utils = DocumentUtils()
 
-    llm = ChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
+    llm = RateLimitedChatOpenAI(temperature=0.5, model="gpt-3.5-turbo")
 
     def __init__(self, org_id, project_id) -> None:
         self.org_id = org_id
@@ -173,8 +173,7 @@ class ChecklistFromDocumentDirectText:
             # Convert to string array
             tasks = [task.get("title") for task in tasks]
 
-            checklist_status_indicators_generator_agent = ChecklistStatusIndicatorsGeneratorAgent()
-            generated_status_indicators = checklist_status_indicators_generator_agent.generate_status_indicators(
+            generated_status_indicators = status_indicators_batcher.generate_status_indicators(
                 generated_checklist.get('title'), tasks)
 
             if generated_status_indicators and generated_status_indicators.get('status_indicators') and len(generated_status_indicators.get('status_indicators')) > 0:
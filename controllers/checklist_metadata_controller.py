@@ -4,10 +4,10 @@ from agents.checklist_metadata_generator import ChecklistMetadataGenerator
 
 class ChecklistMetadataController():
 
-    def generate_checklist_metadata(self, checklist, tasks):
+    def generate_checklist_metadata(self, checklist, tasks, org_id=None):
         try:
             checklist_metadata_generator = ChecklistMetadataGenerator()
-            result = checklist_metadata_generator.bulk_generate_metadata(checklist, tasks)
+            result = checklist_metadata_generator.bulk_generate_metadata(checklist, tasks, org_id)
 
             return result
         except ValueError as error:
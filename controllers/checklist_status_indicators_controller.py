@@ -1,4 +1,4 @@
-from agents.checklist_status_indicators_generator_agent import ChecklistStatusIndicatorsGeneratorAgent
+from services.status_indicators_batcher import status_indicators_batcher
 
 
 class ChecklistStatusIndicatorsController():
@@ -8,8 +8,7 @@ class ChecklistStatusIndicatorsController():
 
     def generate_status_indicators(self, title, tasks):
         try:
-            checklist_status_indicators_generator_agent = ChecklistStatusIndicatorsGeneratorAgent()
-            result = checklist_status_indicators_generator_agent.generate_status_indicators(
+            result = status_indicators_batcher.generate_status_indicators(
                 title, tasks)
 
             return result
@@ -9,7 +9,7 @@ from utils.agent_utils import (create_agent, create_agent_manager_and_agent,
 from utils.checklist_utils import save_checklist_with_status_indicators, process_generated_status_indicators
 from utils.utils import get_user_id
 
-from agents.checklist_status_indicators_generator_agent import ChecklistStatusIndicatorsGeneratorAgent
+from services.status_indicators_batcher import status_indicators_batcher
 
 class ChecklistUsingAgentController():
     org_id: str
@@ -19,10 +19,11 @@ class ChecklistUsingAgentController():
     organization: str
     agent_manager_id: str
     role: str
+    progress_callback = None
 
     # Dependencies
 
-    def __init__(self, org_id: str, project_id: str, name: str, project: str, organization: str, agent_manager_id: str, role: str) -> None:
+    def __init__(self, org_id: str, project_id: str, name: str, project: str, organization: str, agent_manager_id: str, role: str, progress_callback=None) -> None:
         self.org_id = org_id
         self.project_id = project_id
         self.name = name
@@ -30,6 +31,12 @@ class ChecklistUsingAgentController():
         self.organization = organization
         self.agent_manager_id = agent_manager_id
         self.role = role
+        # Optional `progress_callback(stage, details)` used by the jobs API to track the pipeline
+        self.progress_callback = progress_callback
+
+    def report_progress(self, stage, details=None):
+        if self.progress_callback is not None:
+            self.progress_callback(stage, details)
 
     def org_limit_validation(self) -> bool:
         query_result = get_organization_agent_managers_by_id(self.org_id)
@@ -122,8 +129,8 @@ class ChecklistUsingAgentController():
             # Convert to string array
             tasks = [task.get("title") for task in tasks]
 
-            checklist_status_indicators_generator_agent = ChecklistStatusIndicatorsGeneratorAgent()
-            generated_status_indicators = checklist_status_indicators_generator_agent.generate_status_indicators(
+            self.report_progress("status_indicators")
+            generated_status_indicators = status_indicators_batcher.generate_status_indicators(
                 generated_checklist.get('title'), tasks)
 
             if generated_status_indicators and generated_status_indicators.get('status_indicators') and len(generated_status_indicators.get('status_indicators')) > 0:
@@ -162,6 +169,7 @@ class ChecklistUsingAgentController():
             raise ValueError("Agent Manager creation is failed")
 
         # Generate and a prompt
+        self.report_progress("prompt")
         checklist_prompt_generator = ChecklistPromptGenerator(
             prompt_generator_agent_id)
         generated_prompt = checklist_prompt_generator.generate_prompt(
@@ -174,6 +182,7 @@ class ChecklistUsingAgentController():
             agent_manager_id, checklist_generator_agent_id, checklist_generator_agent_name)
 
         # Store the checklist result
+        self.report_progress("checklist")
         checklist_generator = ChecklistGenerator(
             checklist_generator_agent_id)
         generated_checklist = checklist_generator.generate_checklist_using_subsequent_chain(
@@ -205,6 +214,7 @@ class ChecklistUsingAgentController():
             generated_status_indicators, checklist_id)
 
         # Save to DB
+        self.report_progress("save")
         checklist_mutation_result = save_checklist_with_status_indicators(
             insert_checklist, insert_status_indicators)
 
@@ -2,4 +2,11 @@ try:
     import gevent.monkey
     gevent.monkey.patch_all()
 except ImportError:
-    pass
\ No newline at end of file
+    pass
+
+
+def on_starting(server):
+    # Background jobs (`?async=true`, /jobs, the SSE stream) are kept in the memory of the worker that runs them,
+    # so a job could not be polled or cancelled from any other worker
+    if server.cfg.workers > 1:
+        raise RuntimeError("The job API only supports a single worker, start gunicorn with --workers=1.")
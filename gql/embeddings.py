@@ -9,13 +9,42 @@ INSERT_EMBEDDING_DOCUMENT_MUTATION = """
     }
 """
 
-QUERY_EMBEDDINGS_DOCUMENT_BY_HASH = """
-    query QueryEmbeddingsDocumentByHash($md5_hash: String!, $orgId: uuid!) {
-        embeddings_document(where: {md5_hash: {_eq: $md5_hash}, org_id: {_eq: $orgId}}) {
-            embeddings {
+QUERY_EMBEDDING_VECTORS_BY_HASH = """
+    query QueryEmbeddingVectorsByHash($md5_hash: String!, $orgId: uuid!) {
+        embeddings_document(where: {md5_hash: {_eq: $md5_hash}, org_id: {_eq: $orgId}}, limit: 1) {
+            id
+            embeddings(order_by: {order_number: asc}) {
+                embedding
+                source_embedding_id
+            }
+        }
+    }
+"""
+
+QUERY_EMBEDDING_TEXTS_BY_ORDER_NUMBERS = """
+    query QueryEmbeddingTextsByOrderNumbers($embeddings_document_id: uuid!, $order_numbers: [Int!]!) {
+        embeddings(where: {embeddings_document_id: {_eq: $embeddings_document_id}, order_number: {_in: $order_numbers}}, order_by: {order_number: asc}) {
+            order_number
             text
+        }
+    }
+"""
+
+QUERY_EMBEDDINGS_BY_CHUNK_HASHES = """
+    query QueryEmbeddingsByChunkHashes($chunk_hashes: [String!]!, $orgId: uuid!) {
+        embeddings(where: {chunk_hash: {_in: $chunk_hashes}, embedding: {_is_null: false}, embeddings_document: {org_id: {_eq: $orgId}}}, distinct_on: chunk_hash) {
+            id
+            chunk_hash
+            embedding
+        }
+    }
+"""
+
+QUERY_EMBEDDING_VECTORS_BY_IDS = """
+    query QueryEmbeddingVectorsByIds($ids: [uuid!]!) {
+        embeddings(where: {id: {_in: $ids}}) {
+            id
             embedding
-            }
         }
     }
 """
@@ -0,0 +1,16 @@
+QUERY_CHUNK_SUMMARIES = """
+    query QueryChunkSummaries($orgId: uuid!, $chunk_hashes: [String!]!, $template_hash: String!, $model: String!) {
+        chunk_summaries(where: {org_id: {_eq: $orgId}, chunk_hash: {_in: $chunk_hashes}, template_hash: {_eq: $template_hash}, model: {_eq: $model}}) {
+            chunk_hash
+            summary
+        }
+    }
+"""
+
+INSERT_CHUNK_SUMMARIES_MUTATION = """
+    mutation InsertChunkSummaries($chunk_summaries: [chunk_summaries_insert_input!]!) {
+        insert_chunk_summaries(objects: $chunk_summaries, on_conflict: {constraint: chunk_summaries_org_id_chunk_hash_template_hash_model_key, update_columns: []}) {
+            affected_rows
+        }
+    }
+"""
@@ -0,0 +1,12 @@
+-- Copy the referenced vectors back before the reference column is dropped
+UPDATE public.embeddings AS embeddings
+    SET embedding = source.embedding
+    FROM public.embeddings AS source
+    WHERE embeddings.source_embedding_id = source.id AND embeddings.embedding IS NULL;
+
+DROP INDEX IF EXISTS public.embeddings_source_embedding_id_idx;
+DROP INDEX IF EXISTS public.embeddings_chunk_hash_idx;
+ALTER TABLE public.embeddings DROP CONSTRAINT IF EXISTS embeddings_embedding_or_source_check;
+ALTER TABLE public.embeddings ALTER COLUMN embedding SET NOT NULL;
+ALTER TABLE public.embeddings DROP COLUMN IF EXISTS source_embedding_id;
+ALTER TABLE public.embeddings DROP COLUMN IF EXISTS chunk_hash;
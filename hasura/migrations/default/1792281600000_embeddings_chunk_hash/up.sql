@@ -0,0 +1,14 @@
+-- Content-addressed chunks: a chunk already embedded by the organization is stored once,
+-- later rows for the same chunk reference the row holding its vector.
+ALTER TABLE public.embeddings ADD COLUMN IF NOT EXISTS chunk_hash text;
+ALTER TABLE public.embeddings ADD COLUMN IF NOT EXISTS source_embedding_id uuid
+    REFERENCES public.embeddings (id) ON UPDATE RESTRICT ON DELETE RESTRICT;
+ALTER TABLE public.embeddings ALTER COLUMN embedding DROP NOT NULL;
+ALTER TABLE public.embeddings ADD CONSTRAINT embeddings_embedding_or_source_check
+    CHECK (embedding IS NOT NULL OR source_embedding_id IS NOT NULL);
+
+-- Lookup of reusable vectors by chunk hash, only rows holding a vector are candidates
+CREATE INDEX IF NOT EXISTS embeddings_chunk_hash_idx
+    ON public.embeddings (chunk_hash) WHERE embedding IS NOT NULL;
+CREATE INDEX IF NOT EXISTS embeddings_source_embedding_id_idx
+    ON public.embeddings (source_embedding_id) WHERE source_embedding_id IS NOT NULL;
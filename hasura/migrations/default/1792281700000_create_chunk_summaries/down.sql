@@ -0,0 +1 @@
+DROP TABLE IF EXISTS public.chunk_summaries;
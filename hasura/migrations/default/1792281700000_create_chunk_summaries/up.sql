@@ -0,0 +1,13 @@
+-- Summaries of document chunks, reused across documents and re-runs of the same organization
+CREATE TABLE IF NOT EXISTS public.chunk_summaries (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    org_id uuid NOT NULL,
+    chunk_hash text NOT NULL,
+    template_hash text NOT NULL,
+    model text NOT NULL,
+    summary text NOT NULL,
+    created_by uuid,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    CONSTRAINT chunk_summaries_org_id_chunk_hash_template_hash_model_key
+        UNIQUE (org_id, chunk_hash, template_hash, model)
+);
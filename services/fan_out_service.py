@@ -0,0 +1,105 @@
+import concurrent.futures
+import threading
+import time
+
+from config import FAN_OUT_ITEM_TIMEOUT_SECONDS, FAN_OUT_MAX_CONCURRENCY, FAN_OUT_MAX_CONCURRENCY_PER_ORG
+
+
+class FanOutService():
+    # One pool per worker process. Under the gevent worker, monkey patching turns these threads and semaphores into greenlets.
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=FAN_OUT_MAX_CONCURRENCY, thread_name_prefix="fan-out")
+    # Semaphore and number of holders (running maps and submitted items) per organization.
+    # An entry is dropped once nothing holds it, so the map does not grow with every organization ever seen.
+    org_semaphores = {}
+    lock = threading.Lock()
+
+    # How often a map checks whether an item that is still queued on the pool has started
+    queued_poll_seconds = 1
+
+    def hold_org_semaphore(self, org_id):
+        with self.lock:
+            entry = self.org_semaphores.get(org_id)
+            if entry is None:
+                entry = {"semaphore": threading.BoundedSemaphore(FAN_OUT_MAX_CONCURRENCY_PER_ORG), "holders": 0}
+                self.org_semaphores[org_id] = entry
+            entry["holders"] += 1
+            return entry
+
+    def unhold_org_semaphore(self, org_id, entry):
+        with self.lock:
+            entry["holders"] -= 1
+            if entry["holders"] == 0 and self.org_semaphores.get(org_id) is entry:
+                del self.org_semaphores[org_id]
+
+    def map(self, func, items, org_id=None, timeout=None, return_exceptions=False):
+        # Results are returned in the order of `items`. With `return_exceptions`, a failed or timed out item
+        # yields its exception instead of failing the whole map. The timeout of an item starts when a pool
+        # thread picks it up, time spent queued behind other maps does not count.
+        if timeout is None:
+            timeout = FAN_OUT_ITEM_TIMEOUT_SECONDS
+
+        org_entry = self.hold_org_semaphore(org_id)
+        try:
+            return self.run_items(func, items, org_id, org_entry, timeout, return_exceptions)
+        finally:
+            self.unhold_org_semaphore(org_id, org_entry)
+
+    def run_items(self, func, items, org_id, org_entry, timeout, return_exceptions):
+        org_semaphore = org_entry["semaphore"]
+        started_at = {}
+
+        def run_item(index, item):
+            started_at[index] = time.monotonic()
+            return func(item)
+
+        def release(_):
+            org_semaphore.release()
+            self.unhold_org_semaphore(org_id, org_entry)
+
+        submitted = []
+        for index, item in enumerate(items):
+            # Blocks while the organization already has its share of calls in flight
+            org_semaphore.acquire()
+            with self.lock:
+                org_entry["holders"] += 1
+            try:
+                future = self.executor.submit(run_item, index, item)
+            except Exception:
+                release(None)
+                raise
+            future.add_done_callback(release)
+            submitted.append(future)
+
+        results = []
+        for index, future in enumerate(submitted):
+            try:
+                while not future.done():
+                    if index not in started_at:
+                        concurrent.futures.wait([future], timeout=self.queued_poll_seconds)
+                        continue
+
+                    remaining = started_at[index] + timeout - time.monotonic()
+                    if remaining <= 0:
+                        future.cancel()
+                        raise TimeoutError(
+                            "Item {} did not complete within {} seconds".format(index, timeout))
+                    concurrent.futures.wait([future], timeout=remaining)
+
+                results.append(future.result())
+            except Exception as error:
+                if not return_exceptions:
+                    for pending_future in submitted[index + 1:]:
+                        pending_future.cancel()
+                    raise error
+
+                results.append(error)
+
+        return results
+
+
+def split_failures(results):
+    # Separates the successful results of a `return_exceptions` map from the failures
+    successes = [result for result in results if not isinstance(result, Exception)]
+    failures = [result for result in results if isinstance(result, Exception)]
+    return successes, failures
@@ -0,0 +1,127 @@
+import concurrent.futures
+import gc
+import threading
+import time
+import uuid
+
+from flask import current_app, g
+
+from config import JOB_MAX_PENDING, JOB_MAX_WORKERS, JOB_RESULT_TTL_SECONDS
+
+
+class JobService():
+    # Shared by every request of the worker so the number of running pipelines stays bounded.
+    # Jobs only live in the memory of the worker that runs them, see the single-worker check in geventlet-config.py.
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=JOB_MAX_WORKERS, thread_name_prefix="checklist-job")
+    jobs = {}
+    # job id -> threading.Event, set when the job is cancelled. The running pipeline reads it from `g.cancel_event`
+    cancel_events = {}
+    lock = threading.Lock()
+
+    def submit(self, name, func, cleanup=None):
+        # `func` receives a `report_stage(stage, details)` callback and returns the job result.
+        # `cleanup` releases what `func` would have released (e.g. a spooled upload) when the job never runs.
+        # Jobs are only visible to their creator, a token without a subject could not be told apart from another one
+        created_by = g.get('jwt_session', {}).get('sub', None)
+        if created_by is None or created_by == "":
+            if cleanup is not None:
+                cleanup()
+            raise PermissionError("Background jobs need a token with a subject.")
+
+        self.remove_expired_jobs()
+
+        with self.lock:
+            pending_jobs = [job for job in self.jobs.values()
+                            if job["status"] in ("queued", "running")]
+            if len(pending_jobs) >= JOB_MAX_PENDING:
+                if cleanup is not None:
+                    cleanup()
+                raise ValueError(
+                    "Too many jobs in progress. Please try again later.")
+
+            job = {
+                "id": str(uuid.uuid4()),
+                "name": name,
+                "status": "queued",
+                "stage": None,
+                "result": None,
+                "error": None,
+                "created_by": created_by,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None
+            }
+            self.jobs[job["id"]] = job
+            self.cancel_events[job["id"]] = threading.Event()
+
+        # The job outlives the request, so carry the app and the session over to the worker
+        app = current_app._get_current_object()
+        jwt_session = g.get('jwt_session', {})
+        self.executor.submit(self.run_job, app, jwt_session, job["id"], func, cleanup)
+
+        return self.get_job(job["id"])
+
+    def run_job(self, app, jwt_session, job_id, func, cleanup=None):
+        def report_stage(stage, details=None):
+            self.update_job(job_id, stage=stage)
+
+        with self.lock:
+            cancel_event = self.cancel_events.get(job_id)
+            job = self.jobs.get(job_id)
+            cancelled = cancel_event is None or job is None or job["status"] != "queued"
+            if not cancelled:
+                job.update(status="running", started_at=time.time())
+
+        if cancelled:
+            # Cancelled before it started
+            if cleanup is not None:
+                cleanup()
+            return
+
+        with app.app_context():
+            g.jwt_session = jwt_session
+            g.cancel_event = cancel_event
+            try:
+                result = func(report_stage)
+                self.update_job(job_id, status="succeeded", result=result,
+                                finished_at=time.time())
+            except Exception as error:
+                print("An error occurred in job", job_id, ":", error)
+                self.update_job(job_id, status="cancelled" if cancel_event.is_set() else "failed",
+                                error=str(error), finished_at=time.time())
+            finally:
+                with self.lock:
+                    self.cancel_events.pop(job_id, None)
+                gc.collect()
+
+    def cancel_job(self, job_id):
+        # A queued job never starts, a running one stops at the next point that checks `g.cancel_event`
+        with self.lock:
+            job = self.jobs.get(job_id)
+            cancel_event = self.cancel_events.get(job_id)
+            if job is None or cancel_event is None:
+                return
+            cancel_event.set()
+            if job["status"] == "queued":
+                job.update(status="cancelled", finished_at=time.time())
+                del self.cancel_events[job_id]
+
+    def update_job(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def remove_expired_jobs(self):
+        expires_before = time.time() - JOB_RESULT_TTL_SECONDS
+        with self.lock:
+            expired_job_ids = [job_id for job_id, job in self.jobs.items()
+                               if job["finished_at"] is not None and job["finished_at"] < expires_before]
+            for job_id in expired_job_ids:
+                del self.jobs[job_id]
@@ -0,0 +1,50 @@
+import concurrent.futures
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from config import OCR_MAX_FRAMES, OCR_TIMEOUT_SECONDS, PDF_EXTRACTION_MAX_WORKERS
+from services.pdf_extraction_service import pdf_extraction_service
+from utils.langchain.document_loaders.document_utils import DocumentUtils
+from utils.langchain.document_loaders.image_ocr_utils import get_frame_count, ocr_image_frame, open_image
+
+
+class OcrService():
+    # The frames run on the PDF extraction process pool, which already recognizes scanned PDF pages,
+    # so a worker process has a single pool of CPU-bound workers.
+    document_utils = DocumentUtils()
+
+    def ocr_uploaded_image(self, uploaded_file):
+        # Text of every frame (the pages of a multi-frame TIFF) in order, the frames are recognized in parallel
+        source = self.document_utils.get_file_source(uploaded_file)
+        try:
+            num_frames = get_frame_count(open_image(source))
+        except Exception as error:
+            raise ValueError("Invalid image file.") from error
+
+        if num_frames > OCR_MAX_FRAMES:
+            raise ValueError(f"Image has too many frames ({num_frames}), the limit is {OCR_MAX_FRAMES}.")
+
+        if PDF_EXTRACTION_MAX_WORKERS <= 0:
+            try:
+                return "\n".join(ocr_image_frame(source, frame_index) for frame_index in range(num_frames))
+            except RuntimeError as error:
+                raise ValueError("Failed to recognize the text of the image.") from error
+
+        executor = pdf_extraction_service.get_executor()
+        futures = [executor.submit(ocr_image_frame, source, frame_index) for frame_index in range(num_frames)]
+        deadline = time.monotonic() + OCR_TIMEOUT_SECONDS
+        try:
+            return "\n".join(future.result(timeout=max(0, deadline - time.monotonic())) for future in futures)
+        except concurrent.futures.TimeoutError as error:
+            raise ValueError("Text recognition of the image did not complete in time.") from error
+        except BrokenProcessPool as error:
+            pdf_extraction_service.reset_executor(executor)
+            raise ValueError("Failed to recognize the text of the image.") from error
+        except RuntimeError as error:
+            raise ValueError("Failed to recognize the text of the image.") from error
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+ocr_service = OcrService()
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+import tiktoken
+
+from config import OPENAI_COMPLETION_TOKENS_ESTIMATE, OPENAI_RATE_LIMITS
+
+
+class TokenBucket():
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available +
+                             (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        # Seconds until `amount` is available, larger requests than the bucket only wait for a full bucket
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.refill_per_second)
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+
+class OpenAIRateLimiter():
+    # Shares the requests and tokens per minute budget of each model between all threads and greenlets of the worker
+
+    def __init__(self, rate_limits):
+        self.rate_limits = rate_limits
+        self.condition = threading.Condition()
+        self.buckets = {}
+        self.queues = {}
+
+    def get_limit_name(self, model_name):
+        # "gpt-4-0613" uses the "gpt-4" limits, "gpt-3.5-turbo-16k" the "gpt-3.5-turbo" ones
+        matches = [name for name in self.rate_limits
+                   if name != "default" and model_name.startswith(name)]
+        return max(matches, key=len) if matches else "default"
+
+    def acquire(self, model_name, tokens, requests=1):
+        limit_name = self.get_limit_name(model_name)
+        ticket = object()
+
+        with self.condition:
+            if limit_name not in self.buckets:
+                limits = self.rate_limits[limit_name]
+                self.buckets[limit_name] = (
+                    TokenBucket(limits["rpm"]), TokenBucket(limits["tpm"]))
+                self.queues[limit_name] = deque()
+
+            request_bucket, token_bucket = self.buckets[limit_name]
+            queue = self.queues[limit_name]
+            queue.append(ticket)
+
+            # First come, first served: only the head of the queue may take budget
+            try:
+                while True:
+                    if queue[0] is ticket:
+                        request_bucket.refill()
+                        token_bucket.refill()
+                        wait_time = max(request_bucket.wait_time(requests),
+                                        token_bucket.wait_time(tokens))
+                        if wait_time == 0:
+                            request_bucket.take(requests)
+                            token_bucket.take(tokens)
+                            return
+                        self.condition.wait(wait_time)
+                    else:
+                        self.condition.wait()
+            finally:
+                queue.remove(ticket)
+                self.condition.notify_all()
+
+    def get_stats(self):
+        with self.condition:
+            stats = {}
+            for limit_name, (request_bucket, token_bucket) in self.buckets.items():
+                request_bucket.refill()
+                token_bucket.refill()
+                stats[limit_name] = {
+                    "queueDepth": len(self.queues[limit_name]),
+                    "availableRequests": int(request_bucket.available),
+                    "availableTokens": int(token_bucket.available)
+                }
+            return stats
+
+
+def count_tokens(model_name, text):
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+
+    return len(encoding.encode(text))
+
+
+def estimate_tokens(model_name, texts, max_tokens=None):
+    # Prompt tokens counted with tiktoken plus the expected completion
+    prompt_tokens = sum(count_tokens(model_name, text) + 4 for text in texts)
+    return prompt_tokens + (max_tokens or OPENAI_COMPLETION_TOKENS_ESTIMATE)
+
+
+openai_rate_limiter = OpenAIRateLimiter(OPENAI_RATE_LIMITS)
@@ -0,0 +1,140 @@
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from config import (PDF_EXTRACTION_MAX_WORKERS, PDF_EXTRACTION_MIN_PARALLEL_PAGES, PDF_EXTRACTION_PAGES_PER_TASK,
+                    PDF_EXTRACTION_START_METHOD, PDF_MAX_PAGES, PDF_OCR_DPI, PDF_OCR_MAX_PAGES,
+                    PDF_OCR_TIME_BUDGET_SECONDS)
+from utils.langchain.document_loaders.document_utils import DocumentUtils
+from utils.langchain.document_loaders.pdf_page_utils import (choose_pdf_backend, choose_pdf_render_backend,
+                                                             close_pdf_document, extract_page_range,
+                                                             extract_page_text, get_page_count, ocr_pdf_page,
+                                                             open_pdf_document)
+
+
+class PdfExtractionService():
+    # One process pool per worker process, created on first use. Page text extraction and OCR are CPU-bound,
+    # running them in other processes keeps the gevent hub free for the other requests.
+    executor = None
+    lock = threading.Lock()
+    document_utils = DocumentUtils()
+    embedded_image_ocr_logged = False
+
+    def get_executor(self):
+        with self.lock:
+            if PdfExtractionService.executor is None:
+                PdfExtractionService.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACTION_MAX_WORKERS,
+                    mp_context=multiprocessing.get_context(PDF_EXTRACTION_START_METHOD))
+            return PdfExtractionService.executor
+
+    def reset_executor(self, executor):
+        # A worker that died (e.g. OOM-killed) breaks the whole pool, the next document gets a new one
+        with self.lock:
+            if PdfExtractionService.executor is executor:
+                PdfExtractionService.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_results(self, func, tasks, cancel_event=None, deadline=None):
+        # Runs `func(*task)` for every task on the pool and yields the futures in order once they are done.
+        # Only a bounded window of tasks is in flight, so one large document does not queue all of its work at once.
+        # Setting `cancel_event` (or closing the generator) cancels the tasks that did not start yet.
+        executor = self.get_executor()
+        max_in_flight = PDF_EXTRACTION_MAX_WORKERS * 2
+        submitted = []
+        try:
+            next_task = 0
+            while next_task < len(tasks) or len(submitted) > 0:
+                while next_task < len(tasks) and len(submitted) < max_in_flight:
+                    submitted.append(executor.submit(func, *tasks[next_task]))
+                    next_task += 1
+
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ValueError("PDF extraction was cancelled.")
+
+                future = submitted.pop(0)
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                concurrent.futures.wait([future], timeout=timeout)
+                if not future.done():
+                    raise TimeoutError("PDF extraction did not complete in time.")
+                if isinstance(future.exception(), BrokenProcessPool):
+                    raise future.exception()
+
+                yield future
+        except BrokenProcessPool as error:
+            self.reset_executor(executor)
+            raise ValueError("Failed to extract the text of the PDF.") from error
+        finally:
+            for future in submitted:
+                future.cancel()
+
+    def iter_page_texts(self, uploaded_file, cancel_event=None, backend=None):
+        # Yields the text of every page in order, as soon as the page ranges before it are done
+        backend = choose_pdf_backend(backend)
+        source = self.document_utils.get_file_source(uploaded_file)
+        document = open_pdf_document(source, backend)
+
+        num_pages = get_page_count(document, backend)
+        if num_pages > PDF_MAX_PAGES:
+            close_pdf_document(document)
+            raise ValueError(f"PDF has too many pages ({num_pages}), the limit is {PDF_MAX_PAGES}.")
+
+        if num_pages < PDF_EXTRACTION_MIN_PARALLEL_PAGES or PDF_EXTRACTION_MAX_WORKERS <= 0:
+            try:
+                for page_number in range(num_pages):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ValueError("PDF extraction was cancelled.")
+                    yield extract_page_text(document, page_number, backend)
+            finally:
+                close_pdf_document(document)
+            return
+
+        close_pdf_document(document)
+        del document
+
+        page_ranges = [(source, start, min(start + PDF_EXTRACTION_PAGES_PER_TASK, num_pages), backend)
+                       for start in range(0, num_pages, PDF_EXTRACTION_PAGES_PER_TASK)]
+        for future in self.iter_results(extract_page_range, page_ranges, cancel_event):
+            for page_text in future.result():
+                yield page_text
+
+    def ocr_pages(self, uploaded_file, page_numbers, cancel_event=None):
+        # OCR of the given pages, in parallel and within PDF_OCR_TIME_BUDGET_SECONDS for the whole document.
+        # Returns the text per page number, pages that failed or did not make it in time are left out.
+        backend = choose_pdf_render_backend()
+        if backend == "pypdf2" and not PdfExtractionService.embedded_image_ocr_logged:
+            PdfExtractionService.embedded_image_ocr_logged = True
+            print("pypdfium2 could not be loaded, PDF OCR falls back to the embedded page images")
+        source = self.document_utils.get_file_source(uploaded_file)
+        deadline = time.monotonic() + PDF_OCR_TIME_BUDGET_SECONDS
+        if len(page_numbers) > PDF_OCR_MAX_PAGES:
+            print("OCR limited to the first", PDF_OCR_MAX_PAGES, "of", len(page_numbers), "pages without text")
+            page_numbers = page_numbers[:PDF_OCR_MAX_PAGES]
+
+        texts = {}
+        if PDF_EXTRACTION_MAX_WORKERS <= 0:
+            for page_number in page_numbers:
+                if time.monotonic() > deadline or (cancel_event is not None and cancel_event.is_set()):
+                    break
+                try:
+                    texts[page_number] = ocr_pdf_page(source, page_number, backend, PDF_OCR_DPI)
+                except Exception as error:
+                    print("OCR of page", page_number, "failed:", error)
+            return texts
+
+        tasks = [(source, page_number, backend, PDF_OCR_DPI) for page_number in page_numbers]
+        try:
+            for page_number, future in zip(page_numbers, self.iter_results(ocr_pdf_page, tasks, cancel_event, deadline)):
+                if future.exception() is not None:
+                    print("OCR of page", page_number, "failed:", future.exception())
+                else:
+                    texts[page_number] = future.result()
+        except TimeoutError:
+            print("OCR time budget exceeded,", len(texts), "of", len(page_numbers), "pages recognized")
+
+        return texts
+
+
+pdf_extraction_service = PdfExtractionService()
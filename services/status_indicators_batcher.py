@@ -0,0 +1,86 @@
+import threading
+
+from agents.checklist_status_indicators_generator_agent import ChecklistStatusIndicatorsGeneratorAgent
+from config import STATUS_INDICATORS_BATCH_WINDOW_MS, STATUS_INDICATORS_MAX_BATCH_SIZE
+
+
+class StatusIndicatorsBatcher():
+    # Collects concurrent status indicator requests for a short window and sends them as one multi-checklist prompt
+
+    def __init__(self, window_ms=STATUS_INDICATORS_BATCH_WINDOW_MS, max_batch_size=STATUS_INDICATORS_MAX_BATCH_SIZE):
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.timer = None
+
+    def generate_status_indicators(self, title, tasks):
+        # Same result as ChecklistStatusIndicatorsGeneratorAgent.generate_status_indicators
+        if self.window_seconds <= 0 or self.max_batch_size <= 1:
+            return ChecklistStatusIndicatorsGeneratorAgent().generate_status_indicators(title, tasks)
+
+        request = {
+            "title": title,
+            "tasks": tasks,
+            "result": None,
+            "done": threading.Event()
+        }
+
+        batch = None
+        with self.lock:
+            self.pending.append(request)
+            if len(self.pending) >= self.max_batch_size:
+                batch = self.take_pending()
+            elif self.timer is None:
+                self.timer = threading.Timer(
+                    self.window_seconds, self.flush_pending)
+                self.timer.daemon = True
+                self.timer.start()
+
+        # A full batch is sent right away by the request that filled it
+        if batch is not None:
+            self.process_batch(batch)
+
+        request["done"].wait()
+
+        # Checklists missing from the batched answer are generated by their own caller,
+        # so the fallbacks of a batch run concurrently instead of one after another in the flushing thread
+        if request["result"] is None:
+            return ChecklistStatusIndicatorsGeneratorAgent().generate_status_indicators(title, tasks)
+
+        return request["result"]
+
+    def take_pending(self):
+        batch = self.pending
+        self.pending = []
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return batch
+
+    def flush_pending(self):
+        with self.lock:
+            batch = self.take_pending()
+        if len(batch) > 0:
+            self.process_batch(batch)
+
+    def process_batch(self, batch):
+        # A batch of one is left to its caller, requests without a result fall back to a single call
+        try:
+            if len(batch) > 1:
+                try:
+                    results = ChecklistStatusIndicatorsGeneratorAgent().generate_bulk_status_indicators(
+                        [{"title": request["title"], "tasks": request["tasks"]} for request in batch])
+                except Exception as error:
+                    print("Batched status indicators generation failed:", error)
+                    results = []
+
+                for request, result in zip(batch, results):
+                    if result is not None and result.get("status_indicators"):
+                        request["result"] = result
+        finally:
+            for request in batch:
+                request["done"].set()
+
+
+status_indicators_batcher = StatusIndicatorsBatcher()
@@ -0,0 +1,101 @@
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans, kmeans_plusplus
+
+from config import (CLUSTER_LATENCY_SLO_SECONDS, CLUSTER_MAX_CLUSTERS, CLUSTER_PROMPT_TOKEN_BUDGET,
+                    CLUSTER_SUMMARY_LATENCY_SECONDS_ESTIMATE, CLUSTER_SUMMARY_TOKENS_ESTIMATE, CLUSTERING_RANDOM_STATE,
+                    CLUSTERING_STRATEGY, FAN_OUT_MAX_CONCURRENCY_PER_ORG)
+
+# With "auto", documents up to this many chunks use full KMeans and larger ones MiniBatchKMeans.
+# See benchmarks/bench_clustering.py: k-means++ seeding alone is no faster than MiniBatchKMeans on large inputs.
+KMEANS_MAX_CHUNKS = 1000
+
+
+def choose_clustering_strategy(num_chunks):
+    if CLUSTERING_STRATEGY != "auto":
+        return CLUSTERING_STRATEGY
+    if num_chunks <= KMEANS_MAX_CHUNKS:
+        return "kmeans"
+    return "minibatch_kmeans"
+
+
+def get_closest_points(embeddings, centers):
+    # Index of the point closest to each center, for all centers in one pass: |x|^2 - 2x.c + |c|^2
+    squared_distances = (np.einsum('ij,ij->i', embeddings, embeddings)[:, np.newaxis]
+                         - 2 * (embeddings @ centers.T)
+                         + np.einsum('ij,ij->i', centers, centers)[np.newaxis, :])
+    return np.argmin(squared_distances, axis=0)
+
+
+def farthest_point_sampling(embeddings, num_points):
+    # Starts from the point closest to the centroid, then repeatedly adds the point farthest from those selected
+    first_index = int(get_closest_points(
+        embeddings, embeddings.mean(axis=0, keepdims=True))[0])
+    selected_indices = [first_index]
+    min_distances = np.linalg.norm(embeddings - embeddings[first_index], axis=1)
+
+    for _ in range(1, num_points):
+        next_index = int(np.argmax(min_distances))
+        selected_indices.append(next_index)
+        min_distances = np.minimum(min_distances, np.linalg.norm(
+            embeddings - embeddings[next_index], axis=1))
+
+    return np.asarray(selected_indices)
+
+
+def select_representatives(embeddings, num_clusters, strategy=None, random_state=CLUSTERING_RANDOM_STATE):
+    # Sorted indices of the chunks that represent the document, at most `num_clusters` of them
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    num_clusters = max(1, min(int(num_clusters), len(embeddings)))
+    strategy = strategy or choose_clustering_strategy(len(embeddings))
+
+    if strategy == "kmeans":
+        kmeans = KMeans(n_clusters=num_clusters, n_init=1,
+                        random_state=random_state).fit(embeddings)
+        indices = get_closest_points(embeddings, kmeans.cluster_centers_)
+    elif strategy == "minibatch_kmeans":
+        kmeans = MiniBatchKMeans(n_clusters=num_clusters, n_init=1, batch_size=1024,
+                                 random_state=random_state).fit(embeddings)
+        indices = get_closest_points(embeddings, kmeans.cluster_centers_)
+    elif strategy == "kmeans_plusplus":
+        # The seeds are actual chunks, so the seeding alone already yields well spread representatives
+        _, indices = kmeans_plusplus(
+            embeddings, n_clusters=num_clusters, random_state=random_state)
+    elif strategy == "farthest_point":
+        indices = farthest_point_sampling(embeddings, num_clusters)
+    else:
+        raise ValueError("Unknown clustering strategy: " + str(strategy))
+
+    return sorted(set(int(index) for index in indices))
+
+
+def compute_num_clusters(num_chunks, token_budget=CLUSTER_PROMPT_TOKEN_BUDGET, summary_tokens=CLUSTER_SUMMARY_TOKENS_ESTIMATE,
+                         latency_slo_seconds=CLUSTER_LATENCY_SLO_SECONDS, summary_latency_seconds=CLUSTER_SUMMARY_LATENCY_SECONDS_ESTIMATE,
+                         concurrency=FAN_OUT_MAX_CONCURRENCY_PER_ORG, max_clusters=CLUSTER_MAX_CLUSTERS,
+                         limit_by_token_budget=True):
+    # The summaries of all clusters must fit the final prompt budget, and be produced within the SLO
+    # by `concurrency` parallel calls of `summary_latency_seconds` each.
+    # With the summary tree reduce, the token budget is enforced by merging summaries instead.
+    summarization_waves = max(1, int(latency_slo_seconds // summary_latency_seconds))
+    latency_limit = summarization_waves * concurrency
+
+    limits = {
+        "chunks": num_chunks,
+        "latencySlo": latency_limit,
+        "maxClusters": max_clusters
+    }
+    if limit_by_token_budget:
+        limits["tokenBudget"] = max(1, token_budget // summary_tokens)
+    num_clusters = max(1, min(limits.values()))
+
+    return num_clusters, {
+        "numChunks": num_chunks,
+        "numClusters": num_clusters,
+        "limitedBy": min(limits, key=limits.get),
+        "tokenBudget": token_budget,
+        "summaryTokensEstimate": summary_tokens,
+        "latencySloSeconds": latency_slo_seconds,
+        "summaryLatencySecondsEstimate": summary_latency_seconds,
+        "concurrency": concurrency,
+        "maxClusters": max_clusters,
+        "strategy": choose_clustering_strategy(num_chunks)
+    }
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DISK_BYTES, EMBEDDING_CACHE_MEMORY_BYTES
+
+
+class EmbeddingCache():
+    # Document embeddings keyed by (org_id, md5_hash): an in-process LRU and an optional on-disk tier.
+    # Disk entries are memory-mapped, so the workers of a node share them through the page cache.
+
+    def __init__(self, memory_bytes=EMBEDDING_CACHE_MEMORY_BYTES, cache_dir=EMBEDDING_CACHE_DIR, disk_bytes=EMBEDDING_CACHE_DISK_BYTES):
+        self.memory_bytes = memory_bytes
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self.lock = threading.Lock()
+
+        # key -> {"embeddings_document_id": "", "embeddings": np.ndarray}
+        self.memory = OrderedDict()
+        self.memory_used_bytes = 0
+
+        # Running estimate of the disk tier size, the directory is only scanned once it crosses the limit.
+        # Other workers write to the same directory, each scan corrects the estimate.
+        self.disk_used_bytes = None
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_key(self, org_id, md5_hash):
+        return hashlib.sha256("{}:{}".format(org_id, md5_hash).encode('utf-8')).hexdigest()
+
+    def get(self, org_id, md5_hash):
+        key = self.get_key(org_id, md5_hash)
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry
+
+        entry = self.read_from_disk(key)
+        if entry is not None:
+            with self.lock:
+                self.add_to_memory(key, entry)
+
+        return entry
+
+    def put(self, org_id, md5_hash, embeddings_document_id, embeddings):
+        key = self.get_key(org_id, md5_hash)
+        entry = {
+            "embeddings_document_id": embeddings_document_id,
+            "embeddings": np.ascontiguousarray(embeddings, dtype=np.float32)
+        }
+
+        with self.lock:
+            self.add_to_memory(key, entry)
+
+        self.write_to_disk(key, entry)
+
+    def delete(self, org_id, md5_hash):
+        key = self.get_key(org_id, md5_hash)
+
+        with self.lock:
+            self.remove_from_memory(key)
+
+        if self.cache_dir:
+            vectors_path = os.path.join(self.cache_dir, key + ".npy")
+            self.remove_from_disk(vectors_path)
+
+    def remove_from_memory(self, key):
+        entry = self.memory.pop(key, None)
+        if entry is not None:
+            self.memory_used_bytes -= entry["embeddings"].nbytes
+
+    def add_to_memory(self, key, entry):
+        size = entry["embeddings"].nbytes
+        if size > self.memory_bytes:
+            return
+
+        self.remove_from_memory(key)
+
+        self.memory[key] = entry
+        self.memory_used_bytes += size
+
+        while self.memory_used_bytes > self.memory_bytes:
+            _, evicted_entry = self.memory.popitem(last=False)
+            self.memory_used_bytes -= evicted_entry["embeddings"].nbytes
+
+    def read_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+
+        vectors_path = os.path.join(self.cache_dir, key + ".npy")
+        metadata_path = os.path.join(self.cache_dir, key + ".json")
+        try:
+            with open(metadata_path, "r") as metadata_file:
+                metadata = json.load(metadata_file)
+            embeddings = np.load(vectors_path, mmap_mode='r')
+
+            # The access time drives the eviction order of the disk tier
+            os.utime(vectors_path)
+        except (OSError, ValueError):
+            return None
+
+        return {
+            "embeddings_document_id": metadata.get("embeddings_document_id"),
+            "embeddings": embeddings
+        }
+
+    def write_to_disk(self, key, entry):
+        if not self.cache_dir or entry["embeddings"].nbytes > self.disk_bytes:
+            return
+
+        try:
+            # Write to temporary files and rename, so other workers never see a partial entry
+            self.write_atomically(key + ".json", lambda file: file.write(json.dumps({
+                "embeddings_document_id": entry["embeddings_document_id"]
+            }).encode('utf-8')))
+            vectors_path = os.path.join(self.cache_dir, key + ".npy")
+            previous_size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+            self.write_atomically(
+                key + ".npy", lambda file: np.save(file, entry["embeddings"]))
+
+            with self.lock:
+                if self.disk_used_bytes is None:
+                    self.disk_used_bytes = self.scan_disk()[1]
+                else:
+                    self.disk_used_bytes += os.path.getsize(vectors_path) - previous_size
+                over_limit = self.disk_used_bytes > self.disk_bytes
+
+            if over_limit:
+                self.evict_from_disk()
+        except OSError as error:
+            print("Failed to write the embedding cache:", error)
+
+    def write_atomically(self, file_name, write):
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                write(file)
+            os.replace(temporary_path, os.path.join(
+                self.cache_dir, file_name))
+        except Exception:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def scan_disk(self):
+        entries = []
+        used_bytes = 0
+        for directory_entry in os.scandir(self.cache_dir):
+            if directory_entry.name.endswith(".npy"):
+                stat = directory_entry.stat()
+                entries.append((stat.st_mtime, directory_entry.path, stat.st_size))
+                used_bytes += stat.st_size
+        return entries, used_bytes
+
+    def remove_from_disk(self, vectors_path):
+        for path in (vectors_path, vectors_path[:-len(".npy")] + ".json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict_from_disk(self):
+        entries, used_bytes = self.scan_disk()
+
+        # Least recently used entries go first
+        for _, vectors_path, size in sorted(entries):
+            if used_bytes <= self.disk_bytes:
+                break
+            self.remove_from_disk(vectors_path)
+            used_bytes -= size
+
+        with self.lock:
+            self.disk_used_bytes = used_bytes
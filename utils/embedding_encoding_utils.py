@@ -0,0 +1,61 @@
+import base64
+import json
+
+import numpy as np
+
+# Compact embedding storage: base64 of a header byte followed by the raw little-endian vector.
+# The high nibble of the header is the format version, the low nibble the dtype.
+# int8 vectors store their float32 scale right after the header.
+# Rows written before this format are JSON arrays and are still decoded.
+EMBEDDING_ENCODING_VERSION = 1
+
+EMBEDDING_DTYPE_CODES = {
+    "float32": 0,
+    "float16": 1,
+    "int8": 2
+}
+EMBEDDING_DTYPES = {
+    0: np.dtype('<f4'),
+    1: np.dtype('<f2'),
+    2: np.dtype('i1')
+}
+
+
+def encode_embedding(embedding, dtype="float32"):
+    if dtype not in EMBEDDING_DTYPE_CODES:
+        raise ValueError("Unsupported embedding storage dtype: " + str(dtype))
+
+    dtype_code = EMBEDDING_DTYPE_CODES[dtype]
+    vector = np.asarray(embedding, dtype=np.float32)
+    header = bytes([(EMBEDDING_ENCODING_VERSION << 4) | dtype_code])
+
+    if dtype == "int8":
+        max_value = float(np.max(np.abs(vector))) if vector.size > 0 else 0.0
+        scale = max_value / 127 if max_value > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(EMBEDDING_DTYPES[dtype_code])
+        payload = np.asarray([scale], dtype='<f4').tobytes() + quantized.tobytes()
+    else:
+        payload = vector.astype(EMBEDDING_DTYPES[dtype_code]).tobytes()
+
+    return base64.b64encode(header + payload).decode('ascii')
+
+
+def decode_embedding(value):
+    # Returns a float32 NumPy vector for both the compact format and legacy JSON rows
+    if isinstance(value, list):
+        return np.asarray(value, dtype=np.float32)
+    if value.lstrip().startswith('['):
+        return np.asarray(json.loads(value), dtype=np.float32)
+
+    data = base64.b64decode(value)
+    version = data[0] >> 4
+    dtype_code = data[0] & 0x0F
+    if version != EMBEDDING_ENCODING_VERSION or dtype_code not in EMBEDDING_DTYPES:
+        raise ValueError("Unsupported embedding encoding")
+
+    if dtype_code == EMBEDDING_DTYPE_CODES["int8"]:
+        scale = np.frombuffer(data, dtype='<f4', count=1, offset=1)[0]
+        quantized = np.frombuffer(data, dtype=EMBEDDING_DTYPES[dtype_code], offset=5)
+        return quantized.astype(np.float32) * scale
+
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPES[dtype_code], offset=1).astype(np.float32)
@@ -1,62 +1,158 @@
-import json
 import gc
 import uuid
 
 from typing import Dict, List
+
+import numpy as np
+
+from config import EMBEDDING_STORAGE_DTYPE
 from services.hasura_service import HasuraService
-from gql.embeddings import INSERT_EMBEDDING_DOCUMENT_MUTATION, QUERY_EMBEDDINGS_DOCUMENT_BY_HASH
+from gql.embeddings import (INSERT_EMBEDDING_DOCUMENT_MUTATION, QUERY_EMBEDDING_TEXTS_BY_ORDER_NUMBERS,
+                            QUERY_EMBEDDING_VECTORS_BY_HASH, QUERY_EMBEDDING_VECTORS_BY_IDS,
+                            QUERY_EMBEDDINGS_BY_CHUNK_HASHES)
+from utils.embedding_cache_utils import EmbeddingCache
+from utils.embedding_encoding_utils import decode_embedding, encode_embedding
 from utils.utils import get_user_id
 from langchain.schema import Document
 
 
 class EmbeddingUtils():
+    embedding_cache = EmbeddingCache()
 
-    def fetch_embeddings_from_database(self, md5_hash, orgId):
+    def fetch_embedding_vectors_from_database(self, md5_hash, orgId):
+        # Phase one: only the vectors, in chunk order, as a (chunks x dimensions) matrix
+        cached_embeddings = self.embedding_cache.get(orgId, md5_hash)
+        if cached_embeddings is not None:
+            # The cached document id is only verified by the phase-two text fetch, see evict_cached_embeddings
+            return {**cached_embeddings, "from_cache": True}
 
-        embeddingsDocumentDetails = self.query_embeddings_document_by_md5_hash(
-            md5_hash, orgId)
-        if (embeddingsDocumentDetails.get("data", None) is None or embeddingsDocumentDetails["data"].get("embeddings_document", None) is None or
-                len(embeddingsDocumentDetails["data"]["embeddings_document"]) == 0):
+        hasura_service = HasuraService()
+        result = hasura_service.execute(
+            QUERY_EMBEDDING_VECTORS_BY_HASH,
+            {
+                "md5_hash": md5_hash,
+                "orgId": orgId
+            }
+        )
+        if (result.get("data", None) is None or result["data"].get("embeddings_document", None) is None or
+                len(result["data"]["embeddings_document"]) == 0):
             return None
 
-        embeddingsDocumentDetails = embeddingsDocumentDetails["data"]["embeddings_document"][0]
-        embeddings = embeddingsDocumentDetails.get("embeddings", None)
+        embeddings_document = result["data"]["embeddings_document"][0]
+        embeddings = embeddings_document.get("embeddings", None)
 
         if embeddings is None or len(embeddings) == 0:
             return None
 
-        result_docs = []
-        result_embeddings = []
-        for embedding in embeddings:
-            result_docs.append(Document(page_content=embedding["text"]))
-            result_embeddings.append(json.loads(embedding["embedding"]))
-
         try:
+            # Reused chunks only reference the row holding their vector
+            source_embedding_ids = [embedding["source_embedding_id"] for embedding in embeddings
+                                    if embedding.get("embedding", None) is None]
+            source_embeddings = self.fetch_embeddings_by_ids(source_embedding_ids)
+
+            encoded_embeddings = []
+            for embedding in embeddings:
+                encoded_embedding = embedding.get("embedding", None)
+                if encoded_embedding is None:
+                    encoded_embedding = source_embeddings.get(embedding.get("source_embedding_id", None), None)
+                if encoded_embedding is None:
+                    return None
+                encoded_embeddings.append(encoded_embedding)
+
+            first_vector = decode_embedding(encoded_embeddings[0])
+            matrix = np.empty((len(encoded_embeddings), first_vector.shape[0]), dtype=np.float32)
+            matrix[0] = first_vector
+            for index in range(1, len(encoded_embeddings)):
+                matrix[index] = decode_embedding(encoded_embeddings[index])
+
+            self.embedding_cache.put(
+                orgId, md5_hash, embeddings_document["id"], matrix)
+
             return {
-                "splitted_docs": result_docs,
-                "embeddings": result_embeddings
+                "embeddings_document_id": embeddings_document["id"],
+                "embeddings": matrix
             }
         finally:
-            del embeddingsDocumentDetails
+            del result
+            del embeddings_document
             del embeddings
 
-            del result_docs
-            del result_embeddings
-
             gc.collect()
 
-    def query_embeddings_document_by_md5_hash(self, md5_hash, orgId):
+    def fetch_embeddings_by_ids(self, embedding_ids, batch_size=500):
+        # Encoded vectors as {embedding_id: embedding}
+        unique_embedding_ids = list(dict.fromkeys(embedding_ids))
+        if len(unique_embedding_ids) == 0:
+            return {}
+
+        hasura_service = HasuraService()
+        embeddings_by_id = {}
+        for start in range(0, len(unique_embedding_ids), batch_size):
+            result = hasura_service.execute(
+                QUERY_EMBEDDING_VECTORS_BY_IDS,
+                {
+                    "ids": unique_embedding_ids[start:start + batch_size]
+                }
+            )
+            if result.get("data", None) is None or result["data"].get("embeddings", None) is None:
+                continue
+
+            for embedding in result["data"]["embeddings"]:
+                embeddings_by_id[embedding["id"]] = embedding["embedding"]
+
+        return embeddings_by_id
+
+    def evict_cached_embeddings(self, md5_hash, orgId):
+        # For a cached entry whose embeddings document no longer exists in the database
+        self.embedding_cache.delete(orgId, md5_hash)
+
+    def fetch_embedding_texts_from_database(self, embeddings_document_id, order_numbers):
+        # Phase two: the texts of the selected chunks only, returned in the order of `order_numbers`
         hasura_service = HasuraService()
         result = hasura_service.execute(
-            QUERY_EMBEDDINGS_DOCUMENT_BY_HASH,
+            QUERY_EMBEDDING_TEXTS_BY_ORDER_NUMBERS,
             {
-                "md5_hash": md5_hash,
-                "orgId": orgId
+                "embeddings_document_id": embeddings_document_id,
+                "order_numbers": [int(order_number) for order_number in order_numbers]
             }
         )
-        return result
+        if result.get("data", None) is None or result["data"].get("embeddings", None) is None:
+            return None
 
-    def save_embeddings(self, documents: List[Dict], embeddings: List[Dict], name, md5_hash, org_id):
+        texts = {embedding["order_number"]: embedding["text"]
+                 for embedding in result["data"]["embeddings"]}
+        if any(int(order_number) not in texts for order_number in order_numbers):
+            return None
+
+        return [Document(page_content=texts[int(order_number)]) for order_number in order_numbers]
+
+    def fetch_embeddings_by_chunk_hashes(self, chunk_hashes, orgId, batch_size=500):
+        # Chunks the organization has already embedded, as {chunk_hash: {"id": embedding_id, "embedding": vector}}
+        hasura_service = HasuraService()
+        unique_chunk_hashes = list(dict.fromkeys(chunk_hashes))
+
+        embeddings_by_chunk_hash = {}
+        for start in range(0, len(unique_chunk_hashes), batch_size):
+            result = hasura_service.execute(
+                QUERY_EMBEDDINGS_BY_CHUNK_HASHES,
+                {
+                    "chunk_hashes": unique_chunk_hashes[start:start + batch_size],
+                    "orgId": orgId
+                }
+            )
+            if result.get("data", None) is None or result["data"].get("embeddings", None) is None:
+                continue
+
+            for embedding in result["data"]["embeddings"]:
+                embeddings_by_chunk_hash[embedding["chunk_hash"]] = {
+                    "id": embedding["id"],
+                    "embedding": decode_embedding(embedding["embedding"])
+                }
+
+        return embeddings_by_chunk_hash
+
+    def save_embeddings(self, documents: List[Dict], embeddings: List[Dict], name, md5_hash, org_id,
+                        chunk_hashes: List[str] = None, source_embedding_ids: List[str] = None):
         insert_embeddings_document = {
             "id": str(uuid.uuid4()),
             "name": name,
@@ -66,19 +162,41 @@ class EmbeddingUtils():
         }
         insert_embeddings_documents = [insert_embeddings_document]
 
+        # A vector is stored once per organization, rows of chunks already stored reference it instead
+        embedding_ids_by_chunk_hash = {}
         insert_embeddings = []
         for index, each_embedding in enumerate(embeddings):
-            insert_embeddings.append({
+            insert_embedding = {
+                "id": str(uuid.uuid4()),
                 "text": documents[index].page_content,
-                "embedding": json.dumps(each_embedding),
                 "embeddings_document_id": insert_embeddings_document["id"],
                 "created_by": get_user_id(),
                 "order_number": index
-            })
+            }
+
+            source_embedding_id = source_embedding_ids[index] if source_embedding_ids is not None else None
+            if chunk_hashes is not None:
+                insert_embedding["chunk_hash"] = chunk_hashes[index]
+                if source_embedding_id is None:
+                    source_embedding_id = embedding_ids_by_chunk_hash.get(chunk_hashes[index], None)
+
+            if source_embedding_id is not None:
+                insert_embedding["source_embedding_id"] = source_embedding_id
+            else:
+                insert_embedding["embedding"] = encode_embedding(each_embedding, EMBEDDING_STORAGE_DTYPE)
+                if chunk_hashes is not None:
+                    embedding_ids_by_chunk_hash[chunk_hashes[index]] = insert_embedding["id"]
+
+            insert_embeddings.append(insert_embedding)
 
         self.execute_save_embeddings(
             insert_embeddings_documents, insert_embeddings)
 
+        self.embedding_cache.put(
+            org_id, md5_hash, insert_embeddings_document["id"], embeddings)
+
+        return insert_embeddings_document["id"]
+
     def execute_save_embeddings(self, insert_embeddings_documents: List[Dict], insert_embeddings: List[Dict]):
         if (insert_embeddings_documents is None or len(insert_embeddings_documents) == 0):
             raise ValueError("Embeddings documents must present to insert.")
@@ -93,4 +211,9 @@ class EmbeddingUtils():
             "embeddings": insert_embeddings
         })
 
+        # HasuraService only prints GraphQL errors, a document saved without its embeddings must not be cached
+        if result is None or "errors" in result:
+            errors = result.get("errors", None) if result is not None else None
+            raise ValueError("Failed to save the embeddings: " + str(errors))
+
         return result
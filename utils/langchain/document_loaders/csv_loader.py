@@ -1,4 +1,6 @@
+from config import SPREADSHEET_CHUNK_ROWS
 from utils.langchain.document_loaders.document_loader_abc import DocumentLoaderInterface
+from utils.langchain.document_loaders.spreadsheet_utils import flatten_data_frames
 import pandas as pd
 
 
@@ -9,9 +11,9 @@ class CsvLoader(DocumentLoaderInterface):
         self.uploaded_file = file
 
     def get_file_content(self):
-        data_frame = pd.read_csv(self.uploaded_file)
-        content = ". ".join([". ".join(row.dropna().astype(str).tolist())
-                            for _, row in data_frame.iterrows()])
+        # Read in chunks of rows, each chunk is flattened column-wise
+        with pd.read_csv(self.uploaded_file, chunksize=SPREADSHEET_CHUNK_ROWS) as data_frames:
+            content = flatten_data_frames(data_frames)
         return content
 
     def get_text(self) -> str:
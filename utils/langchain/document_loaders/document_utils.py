@@ -1,17 +1,212 @@
 import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+
+from werkzeug.datastructures import FileStorage
+
+from config import UPLOAD_MAX_BYTES_IN_FLIGHT, UPLOAD_SPOOL_DIR, UPLOAD_SPOOL_MAX_MEMORY_BYTES
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Large reads keep the Python-level loop short, 50 MB is 50 iterations
+HASH_READ_BUFFER_SIZE = 1024 * 1024
+
+
+def new_hash(algorithm):
+    # md5 stays the cache key, blake2b and xxhash (when installed) can be computed alongside
+    if algorithm.startswith("xxh"):
+        if xxhash is None:
+            raise ValueError(f"Hash algorithm {algorithm} requires the xxhash package.")
+        return getattr(xxhash, algorithm)()
+
+    return hashlib.new(algorithm)
+
+
+class HashingReader():
+    # Tee-style stream wrapper, every byte read through it also updates the hashes
+
+    def __init__(self, stream, algorithms=("md5",)):
+        self.stream = stream
+        self.hashes = {algorithm: new_hash(algorithm) for algorithm in algorithms}
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        for hash_object in self.hashes.values():
+            hash_object.update(chunk)
+
+        return chunk
+
+    def drain(self):
+        # Hash whatever has not been read yet
+        while self.read(HASH_READ_BUFFER_SIZE):
+            pass
+
+    def hexdigests(self):
+        return {algorithm: hash_object.hexdigest() for algorithm, hash_object in self.hashes.items()}
+
+
+class SpooledUpload(io.RawIOBase):
+    # Read-only stream over a spooled upload, either bytes kept in memory or a memory-mapped temp file
+
+    def __init__(self, buffer, size, temp_file=None, on_close=None):
+        self.buffer = buffer
+        self.size = size
+        self.temp_file = temp_file
+        self.on_close = on_close
+        self.position = 0
+
+        # Lets other processes open a spooled upload by path instead of receiving its bytes
+        self.path = temp_file.name if temp_file is not None else None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.position + size, self.size)
+        chunk = self.buffer[self.position:end]
+        self.position = max(self.position, end)
+
+        return bytes(chunk)
+
+    def readall(self):
+        return self.read(-1)
+
+    def readinto(self, target):
+        chunk = self.read(len(target))
+        target[:len(chunk)] = chunk
+
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Negative seek position")
+        self.position = offset
+
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if self.closed:
+            return
+
+        super().close()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.buffer = b""
+        if self.temp_file is not None:
+            self.temp_file.close()
+        if self.on_close is not None:
+            self.on_close()
+
+
+class UploadSpool(io.RawIOBase):
+    # Where the request parser writes an uploaded file: bytes are hashed as they arrive and kept in memory
+    # up to the spool threshold, then in a temp file. The spool owns its reservation of bytes in flight
+    # until spool_uploaded_file turns it into a SpooledUpload, closing it before releases everything.
+
+    def __init__(self, algorithms=("md5",), on_close=None):
+        self.hashes = {algorithm: new_hash(algorithm) for algorithm in algorithms}
+        self.file = io.BytesIO()
+        self.temp_file = None
+        self.on_close = on_close
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, chunk):
+        for hash_object in self.hashes.values():
+            hash_object.update(chunk)
+
+        if self.temp_file is None and self.file.tell() + len(chunk) > UPLOAD_SPOOL_MAX_MEMORY_BYTES:
+            self.temp_file = tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR)
+            self.temp_file.write(self.file.getbuffer())
+            self.file = self.temp_file
+
+        return self.file.write(chunk)
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def readall(self):
+        return self.file.read()
+
+    def readinto(self, target):
+        return self.file.readinto(target)
+
+    def readline(self, size=-1):
+        return self.file.readline(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def hexdigests(self):
+        return {algorithm: hash_object.hexdigest() for algorithm, hash_object in self.hashes.items()}
+
+    def detach(self):
+        # Hands the spooled bytes over to a SpooledUpload, which then owns the temp file and the reservation
+        if self.temp_file is not None:
+            self.temp_file.flush()
+            size = os.fstat(self.temp_file.fileno()).st_size
+            buffer = mmap.mmap(self.temp_file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+        else:
+            buffer = self.file.getvalue()
+            size = len(buffer)
+
+        spooled_upload = SpooledUpload(buffer, size, self.temp_file, self.on_close)
+        self.file = io.BytesIO()
+        self.temp_file = None
+        self.on_close = None
+        super().close()
+
+        return spooled_upload
+
+    def close(self):
+        if self.closed:
+            return
+
+        super().close()
+        self.file.close()
+        if self.on_close is not None:
+            self.on_close()
 
 
 class DocumentUtils():
+    # Bytes of uploads currently spooled by this worker
+    bytes_in_flight = 0
+    bytes_in_flight_lock = threading.Lock()
 
     def generate_md5_for_uploaded_file(self, file):
-        md5_hash = hashlib.md5()
-        for chunk in iter(lambda: file.read(4096), b""):
-            md5_hash.update(chunk)
+        reader = HashingReader(file)
+        reader.drain()
 
         # Reset the file pointer to the beginning of the file
         file.seek(0)
 
-        return md5_hash.hexdigest()
+        return reader.hexdigests()["md5"]
 
     def generate_md5_for_text(self, text):
         # Encode the text to convert it into bytes
@@ -25,3 +220,80 @@ class DocumentUtils():
 
         # Return the hexadecimal representation of the MD5 hash
         return md5.hexdigest()
+
+    def get_file_source(self, uploaded_file):
+        # What worker processes open: the path of a spooled upload, or the bytes of anything else
+        path = getattr(uploaded_file, "path", None)
+        if path is not None:
+            return path
+
+        uploaded_file.seek(0)
+        source = uploaded_file.read()
+        uploaded_file.seek(0)
+        return source
+
+    def reserve_upload_bytes(self, size):
+        with DocumentUtils.bytes_in_flight_lock:
+            if DocumentUtils.bytes_in_flight > 0 and DocumentUtils.bytes_in_flight + size > UPLOAD_MAX_BYTES_IN_FLIGHT:
+                raise ValueError("Too many uploads in progress, please try again later.")
+            DocumentUtils.bytes_in_flight += size
+
+    def release_upload_bytes(self, size):
+        with DocumentUtils.bytes_in_flight_lock:
+            DocumentUtils.bytes_in_flight = max(0, DocumentUtils.bytes_in_flight - size)
+
+    def create_upload_spool(self, size=None, algorithms=("md5",)):
+        # Stream factory of the request parser, see SpoolingRequest in app.py.
+        # The size (usually the request content length) counts against the bytes in flight of the worker.
+        reserved_size = size or 0
+        self.reserve_upload_bytes(reserved_size)
+
+        return UploadSpool(algorithms, lambda: self.release_upload_bytes(reserved_size))
+
+    def spool_uploaded_file(self, file, size=None, algorithms=("md5",)):
+        # An upload the request parser already spooled and hashed is used as is, without another copy
+        if isinstance(file.stream, UploadSpool) and not file.stream.closed:
+            hexdigests = file.stream.hexdigests()
+            spooled_file = FileStorage(stream=file.stream.detach(), filename=file.filename,
+                                       content_type=file.content_type)
+            return spooled_file, hexdigests
+
+        # Anything else is copied and hashed in the same pass, the loaders then read the copy.
+        # Small uploads stay in memory, larger ones go to a temp file that is memory-mapped, not read back.
+        reserved_size = size or 0
+        self.reserve_upload_bytes(reserved_size)
+
+        reader = HashingReader(file.stream, algorithms)
+        temp_file = None
+        try:
+            head = reader.read(UPLOAD_SPOOL_MAX_MEMORY_BYTES + 1)
+            if len(head) <= UPLOAD_SPOOL_MAX_MEMORY_BYTES:
+                buffer = head
+                spooled_size = len(head)
+            else:
+                temp_file = tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR)
+                temp_file.write(head)
+                del head
+                for chunk in iter(lambda: reader.read(HASH_READ_BUFFER_SIZE), b""):
+                    temp_file.write(chunk)
+                temp_file.flush()
+                spooled_size = temp_file.tell()
+                buffer = mmap.mmap(temp_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            if temp_file is not None:
+                temp_file.close()
+            self.release_upload_bytes(reserved_size)
+            raise
+
+        spooled_stream = SpooledUpload(buffer, spooled_size, temp_file,
+                                       lambda: self.release_upload_bytes(reserved_size))
+        spooled_file = FileStorage(stream=spooled_stream, filename=file.filename,
+                                   content_type=file.content_type)
+
+        return spooled_file, reader.hexdigests()
+
+    def copy_uploaded_file(self, file, size=None):
+        # The request stream is closed once the response is sent, so background jobs need their own copy
+        copied_file, _ = self.spool_uploaded_file(file, size)
+
+        return copied_file
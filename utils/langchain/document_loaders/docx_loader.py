@@ -1,5 +1,5 @@
 from utils.langchain.document_loaders.document_loader_abc import DocumentLoaderInterface
-from docx import Document
+from utils.langchain.document_loaders.docx_stream_utils import iter_docx_lines
 
 class DocxLoader(DocumentLoaderInterface):
     uploaded_file = None
@@ -8,11 +8,11 @@ class DocxLoader(DocumentLoaderInterface):
         self.uploaded_file = file
         
     def extract_text_from_docx(self):
-        document = Document(self.uploaded_file)
+        # Streams word/document.xml, tables and list items included, see docx_stream_utils
         full_text = []
-        for paragraph in document.paragraphs:
-            full_text.append(paragraph.text)
+        for line in iter_docx_lines(self.uploaded_file):
+            full_text.append(line)
         return '\n'.join(full_text)
 
     def get_text(self) -> str:
-        return self.extract_text_from_docx()
\ No newline at end of file
+        return self.extract_text_from_docx()
@@ -0,0 +1,150 @@
+import zipfile
+
+from lxml import etree
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+PARAGRAPH = WORD_NAMESPACE + "p"
+TEXT = WORD_NAMESPACE + "t"
+TAB = WORD_NAMESPACE + "tab"
+BREAKS = {WORD_NAMESPACE + "br", WORD_NAMESPACE + "cr"}
+PARAGRAPH_STYLE = WORD_NAMESPACE + "pStyle"
+OUTLINE_LEVEL = WORD_NAMESPACE + "outlineLvl"
+NUMBERING = WORD_NAMESPACE + "numPr"
+NUMBERING_ID = WORD_NAMESPACE + "numId"
+NUMBERING_LEVEL = WORD_NAMESPACE + "ilvl"
+TABLE = WORD_NAMESPACE + "tbl"
+TABLE_ROW = WORD_NAMESPACE + "tr"
+TABLE_CELL = WORD_NAMESPACE + "tc"
+BODY = WORD_NAMESPACE + "body"
+VALUE = WORD_NAMESPACE + "val"
+
+
+def get_style_levels(docx_zip):
+    # Heading and list levels per paragraph style id. Headings are found by style name ("heading 2") or outline
+    # level, since the style ids themselves are localized, e.g. "berschrift2" in German templates.
+    try:
+        styles = etree.fromstring(docx_zip.read("word/styles.xml"))
+    except KeyError:
+        return {}, {}
+
+    heading_levels = {}
+    list_levels = {}
+    for style in styles.iter(WORD_NAMESPACE + "style"):
+        style_id = style.get(WORD_NAMESPACE + "styleId")
+        name = style.find(WORD_NAMESPACE + "name")
+        name = name.get(VALUE, "").lower() if name is not None else ""
+        outline_level = style.find(WORD_NAMESPACE + "pPr/" + OUTLINE_LEVEL)
+        numbering = style.find(WORD_NAMESPACE + "pPr/" + NUMBERING)
+
+        if name == "title":
+            heading_levels[style_id] = 1
+        elif name.startswith("heading ") and name[len("heading "):].isdigit():
+            heading_levels[style_id] = int(name[len("heading "):])
+        elif outline_level is not None and outline_level.get(VALUE, "").isdigit() and int(outline_level.get(VALUE)) < 9:
+            heading_levels[style_id] = int(outline_level.get(VALUE)) + 1
+        elif numbering is not None or name.startswith("list "):
+            # "List Bullet 2" style names carry the nesting level, numbering levels of the style are used otherwise
+            numbering_level = numbering.find(NUMBERING_LEVEL) if numbering is not None else None
+            if name.split(" ")[-1].isdigit():
+                list_levels[style_id] = int(name.split(" ")[-1]) - 1
+            elif numbering_level is not None and numbering_level.get(VALUE, "").isdigit():
+                list_levels[style_id] = int(numbering_level.get(VALUE))
+            else:
+                list_levels[style_id] = 0
+
+    return heading_levels, list_levels
+
+
+def format_paragraph(paragraph, heading_levels, list_levels):
+    text = "".join(paragraph["texts"]).strip()
+    if text == "":
+        return ""
+
+    heading_level = paragraph["outline_level"] or heading_levels.get(paragraph["style"])
+    if heading_level:
+        return "#" * heading_level + " " + text
+
+    list_level = paragraph["list_level"]
+    if list_level is None and not paragraph["numbering_removed"]:
+        list_level = list_levels.get(paragraph["style"])
+    if list_level is not None:
+        return "  " * list_level + "- " + text
+    return text
+
+
+def iter_docx_lines(file):
+    # Paragraphs, list items ("- ", indented by level), headings ("#" per level) and table rows
+    # ("cell | cell") of word/document.xml in document order. Elements are dropped once read,
+    # so memory stays bounded by the largest paragraph or table row, not by the document.
+    try:
+        docx_zip = zipfile.ZipFile(file)
+        document_xml = docx_zip.open("word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as error:
+        raise ValueError("Invalid DOCX file.") from error
+
+    heading_levels, list_levels = get_style_levels(docx_zip)
+    paragraphs = []
+    rows = []
+    cells = []
+
+    try:
+        for event, element in etree.iterparse(document_xml, events=("start", "end"), huge_tree=True):
+            tag = element.tag
+            if event == "start":
+                if tag == PARAGRAPH:
+                    paragraphs.append({"texts": [], "style": None, "outline_level": None, "list_level": None,
+                                       "numbering_removed": False})
+                elif tag == TABLE_ROW:
+                    rows.append([])
+                elif tag == TABLE_CELL:
+                    cells.append([])
+                continue
+
+            line = None
+            if tag == TEXT and paragraphs:
+                paragraphs[-1]["texts"].append(element.text or "")
+            elif tag == TAB and paragraphs:
+                paragraphs[-1]["texts"].append("\t")
+            elif tag in BREAKS and paragraphs:
+                paragraphs[-1]["texts"].append("\n")
+            elif tag == PARAGRAPH_STYLE and paragraphs:
+                paragraphs[-1]["style"] = element.get(VALUE)
+            elif tag == OUTLINE_LEVEL and paragraphs and element.get(VALUE, "").isdigit():
+                if int(element.get(VALUE)) < 9:
+                    paragraphs[-1]["outline_level"] = int(element.get(VALUE)) + 1
+            elif tag == NUMBERING and paragraphs:
+                # numId 0 removes the numbering inherited from the style
+                numbering_id = element.find(NUMBERING_ID)
+                numbering_level = element.find(NUMBERING_LEVEL)
+                if numbering_id is not None and numbering_id.get(VALUE) == "0":
+                    paragraphs[-1]["numbering_removed"] = True
+                else:
+                    level = numbering_level.get(VALUE, "0") if numbering_level is not None else "0"
+                    paragraphs[-1]["list_level"] = int(level) if level.isdigit() else 0
+            elif tag == PARAGRAPH and paragraphs:
+                line = format_paragraph(paragraphs.pop(), heading_levels, list_levels)
+            elif tag == TABLE_CELL and cells:
+                cell_text = " ".join(cells.pop())
+                if rows:
+                    rows[-1].append(cell_text)
+            elif tag == TABLE_ROW and rows:
+                line = " | ".join(cell for cell in rows.pop() if cell != "")
+
+            if line:
+                # Inside a table cell (nested tables included) the text belongs to the cell
+                if cells:
+                    cells[-1].append(line)
+                else:
+                    yield line
+
+            if tag in (PARAGRAPH, TABLE) or element.getparent() is not None and element.getparent().tag == BODY:
+                element.clear(keep_tail=False)
+                if element.getparent() is not None and element.getparent().tag == BODY:
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+    except etree.XMLSyntaxError as error:
+        raise ValueError("Invalid DOCX file.") from error
+    finally:
+        document_xml.close()
+        docx_zip.close()
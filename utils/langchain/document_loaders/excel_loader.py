@@ -1,5 +1,6 @@
 from utils.langchain.document_loaders.document_loader_abc import DocumentLoaderInterface
-import pandas as pd
+from utils.langchain.document_loaders.spreadsheet_utils import flatten_data_frames, iter_worksheet_data_frames
+from openpyxl import load_workbook
 
 
 class ExcelLoader(DocumentLoaderInterface):
@@ -9,12 +10,13 @@ class ExcelLoader(DocumentLoaderInterface):
         self.uploaded_file = file
 
     def get_file_content(self):
-        # Read the Excel content using pandas
-        data_frame = pd.read_excel(self.uploaded_file, engine='openpyxl')
-
-        # Convert each row of the DataFrame to a readable string
-        return ". ".join(
-            [". ".join(row.dropna().astype(str).tolist()) for _, row in data_frame.iterrows()])
+        # Stream the rows of all sheets from a read-only workbook, cell values instead of formulas
+        workbook = load_workbook(self.uploaded_file, read_only=True, data_only=True)
+        try:
+            # Convert the rows of every sheet to a readable string
+            return flatten_data_frames(iter_worksheet_data_frames(workbook))
+        finally:
+            workbook.close()
 
     def get_text(self) -> str:
         return self.get_file_content()
@@ -1,6 +1,5 @@
+from services.ocr_service import ocr_service
 from utils.langchain.document_loaders.document_loader_abc import DocumentLoaderInterface
-from PIL import Image
-import pytesseract
 
 
 class ImageLoader(DocumentLoaderInterface):
@@ -10,12 +9,8 @@ class ImageLoader(DocumentLoaderInterface):
         self.uploaded_file = file
 
     def extract_text_from_image(self):
-        # Use PIL to open the image
-        image = Image.open(self.uploaded_file)
-
-        # Use Tesseract to do OCR on the image
-        text = pytesseract.image_to_string(image)
-        print(text)
+        # OCR runs on the OCR process pool, every frame of a multi-frame TIFF is a page
+        text = ocr_service.ocr_uploaded_image(self.uploaded_file)
         return text
 
     def get_text(self):
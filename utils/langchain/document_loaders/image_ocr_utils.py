@@ -0,0 +1,93 @@
+import io
+
+import pytesseract
+from PIL import Image, ImageOps
+
+from config import OCR_BINARIZE, OCR_MAX_PIXELS, OCR_TIMEOUT_SECONDS
+
+# Runs in the PDF extraction processes, keep the imports light so that spawned workers start fast
+
+
+def open_image(source):
+    # The source is the path of a spooled upload or the bytes of a small one
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def get_frame_count(image):
+    return getattr(image, "n_frames", 1)
+
+
+def get_otsu_threshold(image):
+    # Threshold that best separates the two gray-level classes of the histogram
+    histogram = image.histogram()
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+
+    background_count = 0
+    background_weighted = 0
+    best_threshold = 127
+    best_variance = 0
+    for level, count in enumerate(histogram):
+        background_count += count
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+
+        background_weighted += level * count
+        background_mean = background_weighted / background_count
+        foreground_mean = (weighted_total - background_weighted) / foreground_count
+        variance = background_count * foreground_count * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = level
+
+    return best_threshold
+
+
+def preprocess_image(image):
+    # Upright, grayscale, at most OCR_MAX_PIXELS and optionally binarized: Tesseract gains nothing from
+    # a 20 MP photo but spends seconds on it
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+
+    pixels = image.width * image.height
+    if pixels > OCR_MAX_PIXELS:
+        scale = (OCR_MAX_PIXELS / pixels) ** 0.5
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                             Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    if OCR_BINARIZE:
+        threshold = get_otsu_threshold(image)
+        image = image.point(lambda level: 255 if level > threshold else 0, mode="1")
+
+    return image
+
+
+def ocr_image(image):
+    # Also used for the OCR of scanned PDF pages
+    try:
+        return pytesseract.image_to_string(preprocess_image(image), timeout=OCR_TIMEOUT_SECONDS)
+    except Image.DecompressionBombError:
+        # Images are decoded lazily, an oversized one only shows up here
+        raise ValueError("Invalid image file.") from None
+    except Exception as error:
+        # Some pytesseract errors cannot be pickled back to the parent process, which would break the pool
+        raise RuntimeError(f"{type(error).__name__}: {error}") from None
+
+
+def ocr_image_frame(source, frame_index):
+    try:
+        image = open_image(source)
+        if frame_index == 0 and get_frame_count(image) == 1:
+            # Let JPEG decode at a reduced scale right away when the photo is far larger than needed
+            scale = (OCR_MAX_PIXELS / max(1, image.width * image.height)) ** 0.5
+            if scale < 1:
+                image.draft("L", (int(image.width * scale), int(image.height * scale)))
+        else:
+            image.seek(frame_index)
+    except (Image.DecompressionBombError, OSError, EOFError):
+        raise ValueError("Invalid image file.") from None
+
+    return ocr_image(image)
@@ -2,25 +2,35 @@ from langchain import OpenAI
 from langchain.document_loaders import PyPDFLoader
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config import PDF_OCR_ENABLED
+from services.pdf_extraction_service import pdf_extraction_service
 from utils.langchain.document_loaders.document_loader_abc import DocumentLoaderInterface
 
-from PyPDF2 import PdfReader
 from PyPDF2.errors import PdfReadError
 
 
 class PdfLoader(DocumentLoaderInterface):
     uploaded_file = None
+    cancel_event = None
 
-    def __init__(self, file):
+    def __init__(self, file, cancel_event=None):
         self.uploaded_file = file
+        # Stops the extraction of a cancelled job, see JobService.cancel_job
+        self.cancel_event = cancel_event
 
     def extract_text_from_pdf(self):
         try:
-            pdf_reader = PdfReader(self.uploaded_file)
-            if pdf_reader.is_encrypted:
-                raise ValueError("Uploaded file is Encrypted.")
-            
-            texts = [page.extract_text() for page in pdf_reader.pages]
+            # Pages are extracted on the PDF process pool and joined in order
+            texts = list(pdf_extraction_service.iter_page_texts(self.uploaded_file, self.cancel_event))
+
+            # Pages without a text layer (scanned pages) go through OCR
+            image_only_pages = [page_number for page_number, text in enumerate(texts) if text.strip() == ""]
+            if PDF_OCR_ENABLED and len(image_only_pages) > 0:
+                ocr_texts = pdf_extraction_service.ocr_pages(
+                    self.uploaded_file, image_only_pages, self.cancel_event)
+                for page_number, text in ocr_texts.items():
+                    texts[page_number] = text
+
             return ''.join(texts)
         except PdfReadError as e:
             raise ValueError("Invalid PDF file.") from e
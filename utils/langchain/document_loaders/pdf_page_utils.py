@@ -0,0 +1,213 @@
+import contextlib
+import io
+import mmap
+import os
+import threading
+import time
+
+from PIL import Image
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PdfReadError
+
+from config import PDF_BACKEND, PDF_DOCUMENT_CACHE_IDLE_SECONDS
+from utils.langchain.document_loaders.image_ocr_utils import ocr_image
+
+# Runs in the PDF extraction processes, keep the imports light so that spawned workers start fast
+
+# Faster backends. pypdfium2 is in requirements.txt and also renders pages for OCR, PyMuPDF is optional.
+# Both are imported defensively, PyPDF2 and its embedded page images remain the last resort.
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+# Fastest first, see benchmarks/bench_pdf_backends.py. "auto" picks the first one installed.
+PDF_BACKENDS = ["pypdfium2", "pymupdf", "pypdf2"]
+
+# Last document opened by this process, the page ranges of a document usually land on the same few workers.
+# A worker cannot tell which range of a document is its last one, so the document is closed once the worker
+# went PDF_DOCUMENT_CACHE_IDLE_SECONDS without a range of it, the spooled upload is not held open any longer.
+cached_document = {"key": None, "document": None, "in_use": 0, "last_used": 0.0}
+cached_document_lock = threading.Lock()
+
+
+def get_available_pdf_backends():
+    installed = {"pypdfium2": pypdfium2 is not None, "pymupdf": pymupdf is not None, "pypdf2": True}
+    return [backend for backend in PDF_BACKENDS if installed[backend]]
+
+
+def choose_pdf_render_backend():
+    # Pages are rendered by the first installed native backend, PyPDF2 can only extract the embedded images
+    return get_available_pdf_backends()[0]
+
+
+def choose_pdf_backend(backend=None):
+    backend = backend or PDF_BACKEND
+    available_backends = get_available_pdf_backends()
+    if backend == "auto":
+        return available_backends[0]
+    if backend not in available_backends:
+        raise ValueError(f"PDF backend {backend} is not installed.")
+    return backend
+
+
+def open_pdf_document(source, backend):
+    # The source is the path of a spooled upload or the bytes of a small one
+    try:
+        if backend == "pymupdf":
+            if isinstance(source, bytes):
+                document = pymupdf.open(stream=source, filetype="pdf")
+            else:
+                document = pymupdf.open(source, filetype="pdf")
+            if document.needs_pass:
+                raise ValueError("Uploaded file is Encrypted.")
+            return document
+
+        if backend == "pypdfium2":
+            try:
+                return pypdfium2.PdfDocument(source)
+            except pypdfium2.PdfiumError as error:
+                if "password" in str(error).lower():
+                    raise ValueError("Uploaded file is Encrypted.") from error
+                raise
+
+        if isinstance(source, bytes):
+            document = PdfReader(io.BytesIO(source))
+        else:
+            # PdfReader reads a path fully into memory, a memory map keeps the pages in the page cache
+            with open(source, "rb") as file:
+                document = PdfReader(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        if document.is_encrypted:
+            raise ValueError("Uploaded file is Encrypted.")
+        return document
+    except ValueError:
+        raise
+    except Exception as error:
+        # Every backend has its own error types for broken files
+        if isinstance(error, PdfReadError) or backend != "pypdf2":
+            raise ValueError("Invalid PDF file.") from error
+        raise
+
+
+def get_page_count(document, backend):
+    if backend == "pymupdf":
+        return document.page_count
+    if backend == "pypdfium2":
+        return len(document)
+    return len(document.pages)
+
+
+def extract_page_text(document, page_number, backend):
+    if backend == "pymupdf":
+        return document.load_page(page_number).get_text()
+
+    if backend == "pypdfium2":
+        page = document[page_number]
+        text_page = page.get_textpage()
+        try:
+            return text_page.get_text_range().replace("\r\n", "\n")
+        finally:
+            text_page.close()
+            page.close()
+
+    return document.pages[page_number].extract_text() or ""
+
+
+def close_pdf_document(document):
+    # PyMuPDF and pdfium documents hold native memory until they are closed
+    close = getattr(document, "close", None)
+    if close is not None:
+        close()
+
+
+def close_cached_document():
+    if cached_document["document"] is not None:
+        close_pdf_document(cached_document["document"])
+    cached_document["document"] = None
+    cached_document["key"] = None
+
+
+def close_idle_cached_document():
+    with cached_document_lock:
+        idle_seconds = time.monotonic() - cached_document["last_used"]
+        if cached_document["in_use"] == 0 and idle_seconds >= PDF_DOCUMENT_CACHE_IDLE_SECONDS:
+            close_cached_document()
+
+
+@contextlib.contextmanager
+def use_cached_document(source, backend):
+    if isinstance(source, bytes):
+        document = open_pdf_document(source, backend)
+        try:
+            yield document
+        finally:
+            close_pdf_document(document)
+        return
+
+    stat = os.stat(source)
+    key = (backend, source, stat.st_size, stat.st_mtime_ns)
+    with cached_document_lock:
+        if cached_document["key"] != key:
+            close_cached_document()
+            cached_document["document"] = open_pdf_document(source, backend)
+            cached_document["key"] = key
+        cached_document["in_use"] += 1
+        document = cached_document["document"]
+
+    try:
+        yield document
+    finally:
+        with cached_document_lock:
+            cached_document["in_use"] -= 1
+            cached_document["last_used"] = time.monotonic()
+
+        timer = threading.Timer(PDF_DOCUMENT_CACHE_IDLE_SECONDS, close_idle_cached_document)
+        timer.daemon = True
+        timer.start()
+
+
+def extract_page_range(source, start, end, backend="pypdf2"):
+    with use_cached_document(source, backend) as document:
+        return [extract_page_text(document, page_number, backend) for page_number in range(start, end)]
+
+
+def render_page_image(document, page_number, backend, dpi):
+    # Grayscale image of the page at `dpi`, None when the page has nothing to render
+    if backend == "pymupdf":
+        pixmap = document.load_page(page_number).get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+        return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+    if backend == "pypdfium2":
+        page = document[page_number]
+        try:
+            return page.render(scale=dpi / 72, grayscale=True).to_pil().convert("L")
+        finally:
+            page.close()
+
+    # A scanned page is usually one full-page image, downscaled when it is finer than `dpi`
+    page = document.pages[page_number]
+    images = page.images
+    if len(images) == 0:
+        return None
+
+    image = Image.open(io.BytesIO(max(images, key=lambda page_image: len(page_image.data)).data)).convert("L")
+    max_width = int(float(page.mediabox.width) / 72 * dpi)
+    if image.width > max_width > 0:
+        image = image.resize((max_width, max(1, round(image.height * max_width / image.width))))
+    return image
+
+
+def ocr_pdf_page(source, page_number, backend, dpi):
+    with use_cached_document(source, backend) as document:
+        image = render_page_image(document, page_number, backend, dpi)
+
+    # Blank pages are not worth an OCR call
+    if image is None or image.getextrema()[0] > 250:
+        return ""
+
+    return ocr_image(image)
@@ -0,0 +1,57 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from config import SPREADSHEET_CHUNK_ROWS, SPREADSHEET_MAX_CHARACTERS, SPREADSHEET_MAX_ROWS
+
+
+def flatten_data_frame(data_frame):
+    # Text of every row: its non-empty cells joined with ". ", built column by column instead of row by row
+    row_texts = np.full(len(data_frame), "", dtype=object)
+    for column in data_frame.columns:
+        values = data_frame[column]
+        present = values.notna().to_numpy()
+        if not present.any():
+            continue
+
+        cells = values.fillna("").astype(str).to_numpy(dtype=object)
+        separators = np.where(present & (row_texts != ""), ". ", "")
+        row_texts = np.where(present, row_texts + separators + cells, row_texts)
+
+    return [row_text for row_text in row_texts if row_text != ""]
+
+
+def flatten_data_frames(data_frames, max_rows=SPREADSHEET_MAX_ROWS, max_characters=SPREADSHEET_MAX_CHARACTERS):
+    # Joins the rows of consecutive data frames with ". ", stops reading at the row or character cap
+    texts = []
+    num_rows = 0
+    num_characters = 0
+    for data_frame in data_frames:
+        if num_rows >= max_rows or num_characters >= max_characters:
+            print("Spreadsheet truncated to", num_rows, "rows")
+            break
+
+        row_texts = flatten_data_frame(data_frame.iloc[:max_rows - num_rows])
+        if len(row_texts) == 0:
+            continue
+
+        text = ". ".join(row_texts)[:max_characters - num_characters]
+        texts.append(text)
+        num_rows += len(row_texts)
+        num_characters += len(text) + 2
+
+    return ". ".join(texts)
+
+
+def iter_worksheet_data_frames(workbook, chunk_rows=SPREADSHEET_CHUNK_ROWS):
+    # Rows of every sheet, streamed from a read-only workbook. The first row of a sheet is its header.
+    for worksheet in workbook.worksheets:
+        rows = worksheet.iter_rows(values_only=True)
+        next(rows, None)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if len(chunk) == 0:
+                break
+            # Object columns keep each cell as read, without upcasting integers to floats
+            yield pd.DataFrame(chunk, dtype=object)
@@ -1,7 +1,9 @@
+import json
 import json5
-import regex
+import orjson
 import re
 
+
 def parse_agent_result_and_get_json(result):
     try:
         # Convert result to string or extract its `content` field
@@ -14,28 +16,237 @@ def parse_agent_result_and_get_json(result):
 
         result_string = result_string.strip()
 
-        # Extract JSON from code block
-        pattern = r'```json\s*(\{.*?\})\s*```'
-        match = re.search(pattern, result_string, re.DOTALL)
-        if match:
-            json_string = match.group(1).strip()
-        else:
-            # Fallback regex for standalone JSON object
-            json_pattern = r'\{(?:[^{}]|(?R))*\}'
-            match = regex.search(json_pattern, result_string)
-            if match:
-                json_string = match.group().strip()
-            else:
-                print("No valid JSON match found")
-                return None
-
-        # Clean the JSON string and parse it
-        json_string = json_string.replace('\n', '').replace('\r', '').strip()
-        parsed_json = json5.loads(json_string)
+        # Prefer the JSON inside a ```json code block, otherwise the first standalone JSON object
+        json_string = None
+        code_block_start = result_string.find('```json')
+        if code_block_start != -1:
+            json_string = find_json_object(result_string, code_block_start)
+        if json_string is None:
+            json_string = find_json_object(result_string)
+        if json_string is None:
+            print("No valid JSON match found")
+            return None
 
-        return parsed_json
+        return loads_json(json_string)
 
     except Exception as error:
         print(f"Error parsing JSON: {error}")
         print("Raw Result String:", result_string)
         raise
+
+
+def find_json_object(text, start=0):
+    # Single pass, string-aware brace matching. A truncated object is returned as-is so that it can be repaired.
+    object_start = text.find('{', start)
+    if object_start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(object_start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[object_start:index + 1]
+
+    return text[object_start:]
+
+
+def loads_json(json_string):
+    # Fast parsers first, the pure-Python json5 only when the output is not plain JSON
+    try:
+        return orjson.loads(json_string)
+    except orjson.JSONDecodeError:
+        pass
+
+    try:
+        # strict=False accepts the raw newlines LLMs tend to put inside strings
+        return json.loads(json_string, strict=False)
+    except ValueError:
+        pass
+
+    repaired_json_string = repair_json(json_string)
+    try:
+        return json.loads(repaired_json_string, strict=False)
+    except ValueError:
+        pass
+
+    try:
+        return json5.loads(json_string)
+    except ValueError:
+        return json5.loads(repaired_json_string)
+
+
+def repair_json(json_string):
+    # Drops comments and trailing commas and closes a truncated object, without calling the model again
+    output = []
+    stack = []
+    # (output length, open brackets) at every point where the JSON can be cut and closed
+    safe_point = (0, [])
+    in_string = False
+    escaped = False
+
+    index = 0
+    length = len(json_string)
+    while index < length:
+        char = json_string[index]
+
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            index += 1
+            continue
+
+        if char == '/' and json_string.startswith('//', index):
+            newline_index = json_string.find('\n', index)
+            index = length if newline_index == -1 else newline_index
+            continue
+        if char == '/' and json_string.startswith('/*', index):
+            comment_end = json_string.find('*/', index + 2)
+            index = length if comment_end == -1 else comment_end + 2
+            continue
+
+        if char == '"':
+            in_string = True
+            output.append(char)
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            output.append(char)
+            safe_point = (len(output), list(stack))
+        elif char in '}]':
+            if stack and stack[-1] == char:
+                strip_trailing_comma(output)
+                stack.pop()
+                output.append(char)
+                if not stack:
+                    break
+        elif char == ',':
+            safe_point = (len(output), list(stack))
+            output.append(char)
+        else:
+            output.append(char)
+
+        index += 1
+
+    if not stack:
+        return ''.join(output)
+
+    # Truncated output: close what is open, or cut back to the last complete value
+    if in_string:
+        if escaped:
+            output.pop()
+        output.append('"')
+    repaired_json_string = close_json(output, stack)
+    try:
+        json.loads(repaired_json_string, strict=False)
+        return repaired_json_string
+    except ValueError:
+        safe_length, safe_stack = safe_point
+        return close_json(output[:safe_length], safe_stack)
+
+
+def close_json(output, stack):
+    output = list(output)
+    for closing_char in reversed(stack):
+        strip_trailing_comma(output)
+        output.append(closing_char)
+    return ''.join(output)
+
+
+def strip_trailing_comma(output):
+    index = len(output) - 1
+    while index >= 0 and output[index].isspace():
+        index -= 1
+    if index >= 0 and output[index] == ',':
+        del output[index]
+
+
+class StreamingJsonArrayParser():
+    # Incrementally extracts the items of a JSON array field (e.g. "tasks") from a streamed LLM response
+
+    def __init__(self, field_name):
+        self.field_pattern = re.compile(
+            r'"' + re.escape(field_name) + r'"\s*:\s*\[')
+        self.buffer = ""
+        self.position = None
+        self.item_start = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.finished = False
+
+    def feed(self, text):
+        items = []
+        if self.finished or not text:
+            return items
+
+        self.buffer += text
+
+        # Wait until the array itself has started
+        if self.position is None:
+            match = self.field_pattern.search(self.buffer)
+            if match is None:
+                return items
+            self.position = match.end()
+            self.item_start = self.position
+
+        # Resume scanning where the previous chunk stopped
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]' and self.depth > 0:
+                self.depth -= 1
+            elif char in ',]' and self.depth == 0:
+                item = self.parse_item(
+                    self.buffer[self.item_start:self.position])
+                if item is not None:
+                    items.append(item)
+                self.item_start = self.position + 1
+
+                if char == ']':
+                    self.finished = True
+                    break
+
+            self.position += 1
+
+        return items
+
+    def parse_item(self, item_string):
+        item_string = item_string.strip()
+        if item_string == "":
+            return None
+
+        try:
+            return loads_json(item_string)
+        except ValueError:
+            # Skip items the model did not emit as valid JSON
+            return None
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from config import (LLM_CACHE_ENABLED, LLM_CACHE_MAX_BYTES, LLM_CACHE_SQLITE_BUSY_TIMEOUT_MS, LLM_CACHE_SQLITE_PATH,
+                    LLM_CACHE_SQLITE_PURGE_INTERVAL_SECONDS, LLM_CACHE_TTL_SECONDS)
+
+# Bump when the prompt templates or the parsing of their output change in an incompatible way
+LLM_CACHE_SCHEMA_VERSION = "1"
+
+
+class ChecklistLLMCache(BaseCache):
+    # Content-addressed cache for every LangChain LLM call, keyed on the rendered prompt and the llm_string (model, temperature, ...)
+
+    def __init__(self, max_bytes: int, sqlite_path: Optional[str] = None, ttl_seconds: int = 0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+
+        # key -> (expires_at, serialized generations)
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # The SQLite tier has its own lock, a slow or locked database never holds up the in-memory tier
+        self.connection = None
+        self.sqlite_lock = threading.Lock()
+        self.purged_at = 0.0
+        if sqlite_path:
+            try:
+                self.connection = sqlite3.connect(
+                    sqlite_path, timeout=LLM_CACHE_SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+                # WAL lets the workers sharing the file read while one of them writes
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute(
+                    "PRAGMA busy_timeout = {}".format(int(LLM_CACHE_SQLITE_BUSY_TIMEOUT_MS)))
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+                self.connection.commit()
+            except sqlite3.Error as error:
+                print("LLM cache SQLite tier disabled:", error)
+                self.connection = None
+
+    def get_key(self, prompt: str, llm_string: str) -> str:
+        key_source = json.dumps([LLM_CACHE_SCHEMA_VERSION, llm_string, prompt])
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self.get_key(prompt, llm_string)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return self.deserialize(entry[1])
+                self.remove_from_memory(key)
+
+        row = self.read_from_sqlite(key)
+        with self.lock:
+            if row is not None and row[1] > now:
+                self.add_to_memory(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return self.deserialize(row[0])
+
+            self.misses += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self.get_key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+
+        with self.lock:
+            self.add_to_memory(key, value, expires_at)
+
+        self.write_to_sqlite(key, value, expires_at)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+
+        self.run_sqlite(lambda connection: connection.execute("DELETE FROM llm_cache"), commit=True)
+
+    def read_from_sqlite(self, key):
+        return self.run_sqlite(lambda connection: connection.execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone())
+
+    def write_to_sqlite(self, key, value, expires_at):
+        def write(connection):
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+
+            # Expired entries are purged every LLM_CACHE_SQLITE_PURGE_INTERVAL_SECONDS, not on every write
+            now = time.time()
+            if now - self.purged_at >= LLM_CACHE_SQLITE_PURGE_INTERVAL_SECONDS:
+                self.purged_at = now
+                connection.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+
+        self.run_sqlite(write, commit=True)
+
+    def run_sqlite(self, operation, commit=False):
+        # A failing SQLite tier (e.g. "database is locked") is a miss or a skipped write, never a failed LLM call
+        if self.connection is None:
+            return None
+
+        with self.sqlite_lock:
+            try:
+                result = operation(self.connection)
+                if commit:
+                    self.connection.commit()
+                return result
+            except sqlite3.Error as error:
+                print("LLM cache SQLite error:", error)
+                try:
+                    self.connection.rollback()
+                except sqlite3.Error:
+                    pass
+                return None
+
+    def add_to_memory(self, key, value, expires_at):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        self.remove_from_memory(key)
+        self.memory[key] = (expires_at, value)
+        self.memory_bytes += size
+
+        # Evict the least recently used entries until the byte budget fits
+        while self.memory_bytes > self.max_bytes:
+            _, (_, evicted_value) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted_value)
+
+    def remove_from_memory(self, key):
+        entry = self.memory.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= len(entry[1])
+
+    def deserialize(self, value):
+        return [loads(generation) for generation in json.loads(value)]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self.memory),
+                "bytes": self.memory_bytes
+            }
+
+
+llm_cache = None
+
+
+def setup_llm_cache():
+    # Installs the cache globally so every `prompt_template | llm` and LLMChain call goes through it
+    global llm_cache
+    if LLM_CACHE_ENABLED and llm_cache is None:
+        llm_cache = ChecklistLLMCache(
+            LLM_CACHE_MAX_BYTES, LLM_CACHE_SQLITE_PATH, LLM_CACHE_TTL_SECONDS)
+        set_llm_cache(llm_cache)
+
+    return llm_cache
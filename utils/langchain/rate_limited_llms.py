@@ -0,0 +1,40 @@
+from langchain.chat_models import ChatOpenAI
+from langchain.llms import OpenAI
+
+from services.openai_rate_limiter import estimate_tokens, openai_rate_limiter
+
+# The budget is reserved in `_generate`/`_stream`, which LangChain only calls on a cache miss
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+
+    def reserve_budget(self, messages):
+        tokens = estimate_tokens(self.model_name, [str(message.content) for message in messages],
+                                 self.max_tokens)
+        openai_rate_limiter.acquire(self.model_name, tokens)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        # With `streaming` enabled the parent delegates to `_stream`, which reserves the budget itself
+        if not self.streaming:
+            self.reserve_budget(messages)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.reserve_budget(messages)
+        yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class RateLimitedOpenAI(OpenAI):
+
+    def __new__(cls, **data):
+        # OpenAI.__new__ silently returns a plain OpenAIChat for chat model names, which would bypass the limiter
+        model_name = data.get("model_name", data.get("model", ""))
+        if (model_name.startswith("gpt-3.5-turbo") or model_name.startswith("gpt-4")) and "-instruct" not in model_name:
+            raise ValueError(f"{model_name} is a chat model, use RateLimitedChatOpenAI.")
+        return super().__new__(cls, **data)
+
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
+        max_tokens = self.max_tokens if self.max_tokens and self.max_tokens > 0 else None
+        tokens = estimate_tokens(self.model_name, prompts, max_tokens)
+        openai_rate_limiter.acquire(self.model_name, tokens)
+        return super()._generate(prompts, stop=stop, run_manager=run_manager, **kwargs)
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain.embeddings.openai import OpenAIEmbeddings
+
+from config import SEMANTIC_CACHE_MAX_ENTRIES_PER_ORG, SEMANTIC_CACHE_MAX_ORGS, SEMANTIC_CACHE_THRESHOLD
+
+
+class SemanticCache():
+    # In-memory vector index of past prompts, isolated per organization and namespace
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries_per_org=SEMANTIC_CACHE_MAX_ENTRIES_PER_ORG, max_orgs=SEMANTIC_CACHE_MAX_ORGS):
+        self.threshold = threshold
+        self.max_entries_per_org = max_entries_per_org
+        self.max_orgs = max_orgs
+        self.lock = threading.Lock()
+
+        # (org_id, namespace) -> {"vectors": np.ndarray, "values": []}, least recently used first
+        self.indexes = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_embedding(self, text):
+        embeddings_model = OpenAIEmbeddings()
+        embedding = np.asarray(
+            embeddings_model.embed_query(text), dtype=np.float32)
+
+        # Normalize once so that cosine similarity is a plain dot product
+        return embedding / np.linalg.norm(embedding)
+
+    def lookup(self, org_id, namespace, embedding):
+        with self.lock:
+            index = self.indexes.get((org_id, namespace))
+            if index is None:
+                self.misses += 1
+                return None
+
+            self.indexes.move_to_end((org_id, namespace))
+
+            similarities = index["vectors"] @ embedding
+            best_index = int(np.argmax(similarities))
+            if similarities[best_index] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return index["values"][best_index]
+
+    def store(self, org_id, namespace, embedding, value):
+        with self.lock:
+            index = self.indexes.get((org_id, namespace))
+            if index is None:
+                index = {
+                    "vectors": np.empty((0, embedding.shape[0]), dtype=np.float32),
+                    "values": []
+                }
+                self.indexes[(org_id, namespace)] = index
+
+                if len(self.indexes) > self.max_orgs:
+                    self.indexes.popitem(last=False)
+
+            self.indexes.move_to_end((org_id, namespace))
+
+            index["vectors"] = np.vstack([index["vectors"], embedding])
+            index["values"].append(value)
+
+            # Drop the oldest prompts once the index is full
+            overflow = len(index["values"]) - self.max_entries_per_org
+            if overflow > 0:
+                index["vectors"] = index["vectors"][overflow:]
+                index["values"] = index["values"][overflow:]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "indexes": len(self.indexes),
+                "entries": sum(len(index["values"]) for index in self.indexes.values())
+            }
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,48 @@
+import uuid
+from typing import Dict, List
+
+from gql.summaries import INSERT_CHUNK_SUMMARIES_MUTATION, QUERY_CHUNK_SUMMARIES
+from services.hasura_service import HasuraService
+from utils.utils import get_user_id
+
+
+class SummaryCacheUtils():
+    # Chunk summaries keyed by (chunk text hash, summarization template hash, model), per organization
+
+    def fetch_summaries(self, org_id, chunk_hashes: List[str], template_hash, model) -> Dict[str, str]:
+        if chunk_hashes is None or len(chunk_hashes) == 0:
+            return {}
+
+        hasura_service = HasuraService()
+        result = hasura_service.execute(QUERY_CHUNK_SUMMARIES, {
+            "orgId": org_id,
+            "chunk_hashes": list(dict.fromkeys(chunk_hashes)),
+            "template_hash": template_hash,
+            "model": model
+        })
+        if result.get("data", None) is None or result["data"].get("chunk_summaries", None) is None:
+            return {}
+
+        return {chunk_summary["chunk_hash"]: chunk_summary["summary"]
+                for chunk_summary in result["data"]["chunk_summaries"]}
+
+    def save_summaries(self, org_id, summaries: Dict[str, str], template_hash, model):
+        if summaries is None or len(summaries) == 0:
+            return
+
+        insert_chunk_summaries = []
+        for chunk_hash, summary in summaries.items():
+            insert_chunk_summaries.append({
+                "id": str(uuid.uuid4()),
+                "org_id": org_id,
+                "chunk_hash": chunk_hash,
+                "template_hash": template_hash,
+                "model": model,
+                "summary": summary,
+                "created_by": get_user_id()
+            })
+
+        hasura_service = HasuraService()
+        return hasura_service.execute(INSERT_CHUNK_SUMMARIES_MUTATION, {
+            "chunk_summaries": insert_chunk_summaries
+        })
@@ -25,6 +25,11 @@ def get_user_id():
     return userId
 
 
+def get_cancel_event():
+    # Set by JobService for background jobs, None for requests served synchronously
+    return g.get('cancel_event', None)
+
+
 def is_valid_url(url: str):
     if not validators.url(url):
         return False